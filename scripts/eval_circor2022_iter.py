@@ -101,10 +101,9 @@ def segmentation_scores(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, flo
     return res
 
 
-async def run_pcg_advanced(sr: int, x: np.ndarray) -> Dict[str, Any]:
-    res = await srv.pcg_advanced(sampleRate=int(sr), pcm=x.astype('float32').tolist(), hash=None, useHsmm=True, authorization=None)
-    import json as _json
-    return _json.loads(res.body)
+def run_pcg_advanced(sr: int, x: np.ndarray) -> Dict[str, Any]:
+    # same result as /pcg_advanced with useHsmm and no credentials, straight from the core
+    return srv.analyze(x.astype('float32'), int(sr), srv.AnalysisOptions(hsmm_requested=True)).advanced
 
 
 def murmur_score(extras: Dict[str, Any]) -> float:
@@ -138,7 +137,6 @@ def main():
     fetch(f"{BASE}/training_data.csv?download", csv_path)
     subjects = load_subjects(csv_path, args.subjects)
 
-    import asyncio
     seg_metrics = []
     rows = []
     for subj in subjects:
@@ -170,10 +168,7 @@ def main():
             # ground truth labels at 2kHz to match our pipeline
             y_true = tsv_to_labels(tsv_path, 2000)
             # run our analysis
-            try:
-                j = asyncio.get_event_loop().run_until_complete(run_pcg_advanced(int(sr), x))
-            except RuntimeError:
-                j = asyncio.run(run_pcg_advanced(int(sr), x))
+            j = run_pcg_advanced(int(sr), x)
             # derive predicted labels from HSMM path events of /pcg_advanced
             # We rebuild path by mapping envelope peaks to s1/s2 and filling systole/diastole with indices ranges
             n2 = len(y_true)
@@ -68,7 +68,7 @@ def murmur_score_from_extras(extras: Dict[str, Any]) -> float:
     return max(sc(sys), sc(dia))
 
 
-async def analyze_one(wav_path: str) -> Dict[str, Any]:
+def analyze_one(wav_path: str) -> Dict[str, Any]:
     sr, x = wavfile.read(wav_path)
     if x.dtype.kind in ('i','u'):
         x = x.astype(np.float32) / float(np.iinfo(x.dtype).max)
@@ -76,10 +76,8 @@ async def analyze_one(wav_path: str) -> Dict[str, Any]:
         x = x.astype(np.float32)
     if x.ndim > 1:
         x = x[:, 0]
-    res = await srv.pcg_advanced(sampleRate=int(sr), pcm=x.astype('float32').tolist(), hash=None, useHsmm=True, authorization=None)
-    import json as _json
-    j = _json.loads(res.body)
-    return j
+    # same result as /pcg_advanced with useHsmm and no credentials, straight from the core
+    return srv.analyze(x.astype('float32'), int(sr), srv.AnalysisOptions(hsmm_requested=True)).advanced
 
 
 def main():
@@ -100,15 +98,10 @@ def main():
 
     ensure_wavs(ids, args.work_dir)
 
-    import asyncio
     rows = []
     for rid in ids:
         wp = os.path.join(args.work_dir, rid + '.wav')
-        try:
-            j = asyncio.get_event_loop().run_until_complete(analyze_one(wp))
-        except RuntimeError:
-            # in case no running loop
-            j = asyncio.run(analyze_one(wp))
+        j = analyze_one(wp)
         extras = j.get('extras', {})
         murmur = extras.get('murmur', {})
         present = bool(murmur.get('present'))
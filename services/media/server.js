@@ -194,6 +194,18 @@ app.get('/file/:id', async (req, res) => {
     }
     res.setHeader('Content-Type', rec.mimetype);
     res.setHeader('Content-Disposition', buildContentDispositionInline(rec.filename));
+    res.setHeader('Accept-Ranges', 'bytes');
+    // Single byte ranges (e.g. viz reading a WAV header, then a time window); anything else gets the whole file
+    const range = req.headers.range ? req.range(plaintext.length) : null;
+    if (range === -1) {
+      res.setHeader('Content-Range', `bytes */${plaintext.length}`);
+      return res.status(416).end();
+    }
+    if (Array.isArray(range) && range.type === 'bytes' && range.length === 1) {
+      const { start, end } = range[0];
+      res.setHeader('Content-Range', `bytes ${start}-${end}/${plaintext.length}`);
+      return res.status(206).send(plaintext.subarray(start, end + 1));
+    }
     res.send(plaintext);
   } catch (e) {
     console.error(e);
@@ -183,6 +183,36 @@ describe('media-service API', () => {
       .expect(200);
   });
 
+  it('serves byte ranges of a file', async () => {
+    const uploadRes = await request(app)
+      .post('/upload')
+      .set('Authorization', `Bearer ${token}`)
+      .attach('file', sampleBuffer, filename)
+      .expect(200);
+    const mediaId = uploadRes.body.id;
+    const readBody = (res, done) => {
+      const data = [];
+      res.on('data', (chunk) => data.push(chunk));
+      res.on('end', () => done(null, Buffer.concat(data)));
+    };
+
+    const part = await request(app)
+      .get(`/file/${mediaId}`)
+      .set('Authorization', `Bearer ${token}`)
+      .set('Range', 'bytes=4-11')
+      .buffer(true)
+      .parse(readBody)
+      .expect(206);
+    expect(part.headers['content-range']).toBe(`bytes 4-11/${sampleBuffer.length}`);
+    expect(Buffer.compare(Buffer.from(part.body), sampleBuffer.subarray(4, 12))).toBe(0);
+
+    await request(app)
+      .get(`/file/${mediaId}`)
+      .set('Authorization', `Bearer ${token}`)
+      .set('Range', `bytes=${sampleBuffer.length + 10}-`)
+      .expect(416);
+  });
+
   it('blocks other users from accessing private media', async () => {
     const otherToken = jwt.sign({ sub: randomUUID() }, 'secret');
 
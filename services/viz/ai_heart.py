@@ -1,28 +1,57 @@
 import os
 import json
-from typing import Dict, Any, List
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple
 
 import numpy as np
-from scipy.signal import butter, filtfilt, hilbert, find_peaks
-from sklearn.cluster import KMeans
+from scipy import fft as sp_fft
+from scipy.signal import butter, sosfiltfilt, find_peaks
+from cycles import first_after
 
 try:
     from openai import OpenAI
 except Exception:  # pragma: no cover
     OpenAI = None  # type: ignore
 
+# S1/S2 amplitude clustering: 'exact' (sorted 1-D 2-means) or 'kmeans' (scikit-learn reference)
+S1S2_CLUSTERING = os.getenv('VIZ_S1S2_CLUSTERING', 'exact').strip().lower()
+# Threads per FFT; jobs already run in parallel on the compute pool, so one by default
+FFT_WORKERS = int(os.getenv('VIZ_FFT_WORKERS', '1'))
 
-def _bandpass_filter(signal: np.ndarray, fs: int, lowcut=25.0, highcut=400.0, order=4):
+
+@lru_cache(maxsize=32)
+def _bandpass_sos(fs: int, lowcut: float, highcut: float, order: int) -> np.ndarray:
+    # Butterworth band-pass as float32 second-order sections, shared between requests:
+    # callers must not modify it (sosfilt needs a writable buffer, so it is not locked)
     nyq = 0.5 * fs
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, signal)
+    return butter(order, [lowcut / nyq, highcut / nyq], btype='band', output='sos').astype(np.float32)
 
 
-def _compute_envelope(signal: np.ndarray, fs: int, smooth_ms=50):
-    analytic_signal = hilbert(signal)
-    amplitude_env = np.abs(analytic_signal) ** 2
+def _bandpass_filter(signal: np.ndarray, fs: int, lowcut=25.0, highcut=400.0, order=4):
+    x = np.asarray(signal, dtype=np.float32)
+    return sosfiltfilt(_bandpass_sos(int(fs), float(lowcut), float(highcut), int(order)), x).astype(np.float32, copy=False)
+
+
+def _padded_rfft(signal: np.ndarray) -> Tuple[np.ndarray, int]:
+    # rfft zero-padded to a 5-smooth length, so the cost does not hinge on the prime factors of n;
+    # returns (spectrum, padded length), as the length may be odd
+    x = np.asarray(signal, dtype=np.float32)
+    m = sp_fft.next_fast_len(max(1, x.size), real=True)
+    return sp_fft.rfft(x, m, workers=FFT_WORKERS), m
+
+
+def _compute_envelope(signal: np.ndarray, fs: int, smooth_ms=50, padded: Tuple[np.ndarray, int] = None):
+    # |analytic signal|^2 from the padded spectrum (scipy.signal.hilbert on a zero-padded copy),
+    # then a moving average; pass padded when _padded_rfft(signal) is already at hand
+    n = len(signal)
+    spec, m = _padded_rfft(signal) if padded is None else padded
+    h = np.zeros(spec.size, dtype=np.float32)
+    h[0] = 1.0
+    h[1:(m + 1) // 2] = 2.0
+    if m % 2 == 0:
+        h[m // 2] = 1.0
+    analytic = sp_fft.ifft(spec * h, m, workers=FFT_WORKERS)[:n]
+    amplitude_env = (analytic.real ** 2 + analytic.imag ** 2).astype(np.float32)
     window_length = max(int(smooth_ms / 1000 * fs), 1)
     if window_length <= 1:
         return amplitude_env
@@ -30,12 +59,38 @@ def _compute_envelope(signal: np.ndarray, fs: int, smooth_ms=50):
     return np.convolve(amplitude_env, window, mode='same')
 
 
-def _separate_s1_s2(peaks: np.ndarray, env_vals: np.ndarray):
+def _two_means_labels(values: np.ndarray) -> np.ndarray:
+    # Exact 2-means in 1-D: the optimal clusters are a split of the sorted values,
+    # so scan every split point with prefix sums. 1 marks the upper cluster.
+    x = np.asarray(values, dtype=np.float64).ravel()
+    order = np.argsort(x, kind='stable')
+    xs = x[order]
+    n = xs.size
+    labels = np.ones(n, dtype=int)
+    # only split between distinct values; identical values share a cluster
+    cuts = np.flatnonzero(xs[1:] > xs[:-1]) + 1
+    if cuts.size == 0:
+        return labels
+    c1 = np.cumsum(xs)
+    c2 = np.cumsum(xs * xs)
+    left_n, right_n = cuts, n - cuts
+    left_s, right_s = c1[cuts - 1], c1[-1] - c1[cuts - 1]
+    sse = (c2[-1] - right_s ** 2 / right_n - left_s ** 2 / left_n)
+    best = int(cuts[np.argmin(sse)])
+    labels[order[:best]] = 0
+    return labels
+
+
+def _kmeans_labels(values: np.ndarray) -> np.ndarray:
+    from sklearn.cluster import KMeans  # opt-in reference; keeps scikit-learn off the import path
+    return KMeans(n_clusters=2, random_state=42, n_init=10).fit(values.reshape(-1, 1)).labels_
+
+
+def _separate_s1_s2(peaks: np.ndarray, env_vals: np.ndarray, method: str = None):
     if peaks.size < 2:
         return peaks, np.array([], dtype=int)
-    amps = env_vals.reshape(-1, 1)
-    km = KMeans(n_clusters=2, random_state=42, n_init=10).fit(amps)
-    labels = km.labels_
+    amps = np.asarray(env_vals, dtype=np.float64).ravel()
+    labels = _kmeans_labels(amps) if (method or S1S2_CLUSTERING) == 'kmeans' else _two_means_labels(amps)
     means = [amps[labels == i].mean() if np.any(labels == i) else 0.0 for i in [0, 1]]
     s1_label = int(np.argmax(means))
     s1_idx = np.sort(peaks[labels == s1_label])
@@ -45,17 +100,18 @@ def _separate_s1_s2(peaks: np.ndarray, env_vals: np.ndarray):
 
 def analyze_pcg_from_pcm(sample_rate: int, pcm: List[float]) -> Dict[str, Any]:
     fs = int(sample_rate)
-    y = np.asarray(pcm, dtype=np.float64)
+    y = np.asarray(pcm, dtype=np.float32)
     if y.size == 0 or fs <= 0:
         return {"error": "empty"}
     # mono normalization
-    y = y - np.mean(y)
+    y = y - np.mean(y, dtype=np.float64).astype(np.float32)
     m = np.max(np.abs(y))
     if m > 0:
         y = y / m
-    # filtering + envelope
+    # filtering + envelope; one padded spectrum serves the envelope and the band energies
     filtered = _bandpass_filter(y, fs)
-    env = _compute_envelope(filtered, fs)
+    spec, nfft = _padded_rfft(filtered)
+    env = _compute_envelope(filtered, fs, padded=(spec, nfft))
     if np.max(env) > 0:
         env_n = env / np.max(env)
     else:
@@ -70,14 +126,10 @@ def analyze_pcg_from_pcm(sample_rate: int, pcm: List[float]) -> Dict[str, Any]:
 
     # durations
     def durations(a, b):
-        vals = []
-        for t in a:
-            after = b[b > t]
-            if after.size:
-                vals.append(after[0] - t)
-        if not vals:
+        after, found = first_after(a, b)
+        vv = after[found] - a[found]
+        if not vv.size:
             return {"mean": None, "std": None, "count": 0}
-        vv = np.asarray(vals)
         return {"mean": float(np.mean(vv)), "std": float(np.std(vv)), "count": int(vv.size)}
 
     systole = durations(s1_t, s2_t)
@@ -99,8 +151,8 @@ def analyze_pcg_from_pcm(sample_rate: int, pcm: List[float]) -> Dict[str, Any]:
 
     # frequency ratio 150–400 vs 20–150
     n = y.size
-    freqs = np.fft.rfftfreq(n, d=1 / fs)
-    sp = np.abs(np.fft.rfft(filtered)) ** 2
+    freqs = sp_fft.rfftfreq(nfft, d=1 / fs)
+    sp = spec.real ** 2 + spec.imag ** 2
 
     def band_energy(lo, hi):
         mask = (freqs >= lo) & (freqs < hi)
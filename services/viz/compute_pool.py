@@ -0,0 +1,109 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+
+class ComputeUnavailable(Exception):
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ComputeSaturated(ComputeUnavailable):
+    pass
+
+
+class ComputeTimeout(ComputeUnavailable):
+    status_code = 504
+
+
+class ComputePool:
+    """Runs CPU-bound jobs off the event loop with bounded admission.
+
+    Jobs beyond ``workers + queue_depth`` in flight are rejected immediately
+    (503 + Retry-After) instead of piling up behind the executor.
+    """
+
+    def __init__(self, kind: str = 'process', workers: Optional[int] = None, queue_depth: Optional[int] = None,
+                 timeout: Optional[float] = 120.0, retry_after: int = 2, start_method: str = 'forkserver'):
+        kind = (kind or 'process').strip().lower()
+        if kind not in ('process', 'thread'):
+            raise ValueError(f'unknown executor kind: {kind}')
+        self.kind = kind
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.queue_depth = max(0, int(self.workers * 2 if queue_depth is None else queue_depth))
+        self.timeout = timeout if (timeout and timeout > 0) else None
+        self.retry_after = int(retry_after)
+        self.start_method = start_method
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+
+    @classmethod
+    def from_env(cls) -> 'ComputePool':
+        workers = os.getenv('VIZ_WORKERS')
+        depth = os.getenv('VIZ_QUEUE_DEPTH')
+        return cls(
+            kind=os.getenv('VIZ_EXECUTOR', 'process'),
+            workers=int(workers) if workers else None,
+            queue_depth=int(depth) if depth else None,
+            timeout=float(os.getenv('VIZ_JOB_TIMEOUT', '120')),
+            retry_after=int(os.getenv('VIZ_RETRY_AFTER', '2')),
+            start_method=os.getenv('VIZ_MP_START', 'forkserver'),
+        )
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_depth
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == 'thread':
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='viz-compute')
+                else:
+                    ctx = multiprocessing.get_context(self.start_method)
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            return self._executor
+
+    def _release(self, _fut=None):
+        with self._lock:
+            self._inflight -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            if self._inflight >= self.capacity:
+                raise ComputeSaturated('compute pool saturated', self.retry_after)
+            self._inflight += 1
+        try:
+            fut = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        # a slot is freed when the job really finishes, not when the caller gives up
+        fut.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), self.timeout)
+        except asyncio.TimeoutError:
+            fut.cancel()
+            raise ComputeTimeout('compute timeout', self.retry_after)
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM-killed); start a fresh pool on the next job
+            self.shutdown(wait=False)
+            raise ComputeUnavailable('compute worker crashed', self.retry_after)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=wait, cancel_futures=True)
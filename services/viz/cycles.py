@@ -0,0 +1,56 @@
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+
+def first_after(a, b) -> Tuple[np.ndarray, np.ndarray]:
+    """For each a[i], the first element of sorted b strictly greater than it.
+
+    Returns (values, found); values are 0 where nothing in b follows.
+    """
+    a = np.asarray(a)
+    b = np.asarray(b)
+    pos = np.searchsorted(b, a, side='right')
+    found = pos < b.size
+    out = np.zeros(a.shape, dtype=np.result_type(a, b))
+    out[found] = b[pos[found]]
+    return out, found
+
+
+class Cycles(NamedTuple):
+    """Aligned per-cycle event indices: every S1 followed by an S2.
+
+    next_s1 is -1 for the last cycle(s) if the recording ends before another S1.
+    """
+    s1: np.ndarray
+    s2: np.ndarray
+    next_s1: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.s1.size)
+
+    @property
+    def complete(self) -> np.ndarray:
+        return self.next_s1 >= 0
+
+    @property
+    def systole(self) -> np.ndarray:
+        return self.s2 - self.s1
+
+    @property
+    def diastole(self) -> np.ndarray:
+        # -1 where the cycle is not complete
+        return np.where(self.complete, self.next_s1 - self.s2, -1)
+
+
+def cycle_index(s1, s2) -> Cycles:
+    """Pair each S1 with the first later S2, and that S2 with the first later S1.
+
+    Both inputs must be sorted sample indices; O((N + M) log M) via searchsorted.
+    """
+    s1 = np.asarray(s1, dtype=np.int64).reshape(-1)
+    s2 = np.asarray(s2, dtype=np.int64).reshape(-1)
+    s2_of, has_s2 = first_after(s1, s2)
+    c1, c2 = s1[has_s2], s2_of[has_s2]
+    nxt, has_next = first_after(c2, s1)
+    return Cycles(c1, c2, np.where(has_next, nxt, -1))
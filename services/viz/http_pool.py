@@ -0,0 +1,112 @@
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+
+class _SlotReleasingStream(httpx.AsyncByteStream):
+    # Keeps the per-host slot until the response body is consumed or closed
+    def __init__(self, stream: httpx.AsyncByteStream, sem: asyncio.Semaphore):
+        self._stream = stream
+        self._sem = sem
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._sem.release()
+
+
+class _PerHostLimitTransport(httpx.AsyncBaseTransport):
+    """Caps concurrent requests per (scheme, host, port) on top of the pool limits."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int):
+        self._transport = transport
+        self._per_host = per_host
+        self._sems: Dict[Tuple[str, str, Optional[int]], asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = (request.url.scheme, request.url.host, request.url.port)
+        sem = self._sems.get(key)
+        if sem is None:
+            sem = self._sems[key] = asyncio.Semaphore(self._per_host)
+        await sem.acquire()
+        try:
+            resp = await self._transport.handle_async_request(request)
+        except BaseException:
+            sem.release()
+            raise
+        return httpx.Response(
+            status_code=resp.status_code,
+            headers=resp.headers,
+            stream=_SlotReleasingStream(resp.stream, sem),
+            extensions=resp.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class SharedHttpClient:
+    """One keep-alive httpx.AsyncClient shared by every outbound viz call.
+
+    Normally opened and closed by the app lifespan. A client is bound to the
+    event loop that created it, so get() transparently opens a fresh one if
+    it is called from another loop (e.g. when no lifespan ran).
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20, keepalive_expiry: float = 30.0,
+                 per_host: int = 32, timeout: float = 30.0, connect_timeout: float = 5.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.per_host = max(1, int(per_host))
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._transport = transport  # inner transport override, e.g. httpx.MockTransport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_env(cls) -> 'SharedHttpClient':
+        return cls(
+            max_connections=int(os.getenv('VIZ_HTTP_MAX_CONNECTIONS', '100')),
+            max_keepalive=int(os.getenv('VIZ_HTTP_MAX_KEEPALIVE', '20')),
+            keepalive_expiry=float(os.getenv('VIZ_HTTP_KEEPALIVE_EXPIRY', '30')),
+            per_host=int(os.getenv('VIZ_HTTP_PER_HOST', '32')),
+            timeout=float(os.getenv('VIZ_HTTP_TIMEOUT', '30')),
+            connect_timeout=float(os.getenv('VIZ_HTTP_CONNECT_TIMEOUT', '5')),
+        )
+
+    def _open(self) -> httpx.AsyncClient:
+        transport = self._transport or httpx.AsyncHTTPTransport(limits=self.limits)
+        return httpx.AsyncClient(
+            transport=_PerHostLimitTransport(transport, self.per_host),
+            timeout=self.timeout,
+        )
+
+    def get(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            # a client left behind by a finished loop cannot be closed from here; drop it
+            self._client = self._open()
+            self._loop = loop
+        return self._client
+
+    async def start(self):
+        self.get()
+
+    async def aclose(self):
+        client, self._client, self._loop = self._client, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
@@ -1,9 +1,11 @@
 import math
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 
 import numpy as np
 from scipy.signal import resample_poly, get_window
 
+from cycles import first_after
+
 
 def _resample_to_target(y: np.ndarray, sr: int, target_sr: int = 2000) -> Tuple[np.ndarray, int]:
     sr = int(sr)
@@ -78,12 +80,24 @@ def _normalize_colwise(X: np.ndarray) -> np.ndarray:
     return (Z + 3.0) / 6.0
 
 
-def _estimate_hr_bpm(y: np.ndarray, sr: int) -> Tuple[float, float]:
-    # Return (hr_bpm, salience)
-    env = _hilbert_envelope(y, sr, smooth_ms=50.0)
+def _autocorr_lags(x: np.ndarray, max_lag: int) -> np.ndarray:
+    # Same as np.correlate(x, x, 'full')[n-1:n-1+max_lag], via FFT in O(n log n)
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    L = max(0, min(int(max_lag), n))
+    if L == 0:
+        return np.zeros(0, dtype=np.float64)
+    nfft = 1 << int(np.ceil(np.log2(n + L)))
+    spec = np.fft.rfft(x, nfft)
+    return np.fft.irfft(spec * np.conjugate(spec), nfft)[:L]
+
+
+def _estimate_hr_bpm(y: np.ndarray, sr: int, env: Optional[np.ndarray] = None) -> Tuple[float, float]:
+    # Return (hr_bpm, salience); pass env when the 50 ms envelope of y is already at hand
+    if env is None:
+        env = _hilbert_envelope(y, sr, smooth_ms=50.0)
     env = env / (np.max(env) + 1e-9)
-    n = len(env)
-    ac = np.correlate(env, env, mode='full')[n - 1: n - 1 + int(2.0 * sr)]
+    ac = _autocorr_lags(env, int(2.0 * sr))
     min_lag = int(0.3 * sr)  # 200 bpm upper bound
     max_lag = int(1.8 * sr)  # 33 bpm lower bound
     if max_lag <= min_lag + 5:
@@ -117,11 +131,13 @@ def _emission_scores(features: np.ndarray) -> np.ndarray:
     return E.astype(np.float32, copy=False)
 
 
-def _hsmm_viterbi(E: np.ndarray, frame_rate: float, hr_bpm: float) -> np.ndarray:
-    # E: [T, 4] emission scores; returns best state path (ints 0..3)
-    T = E.shape[0]
+_PREV_STATE = np.array([3, 0, 1, 2], dtype=np.int64)  # transitions: 0->1->2->3->0
+
+
+def _duration_logp(frame_rate: float, hr_bpm: float, T: Optional[int] = None) -> np.ndarray:
+    # Gaussian log priors over segment durations (in frames), shape [4, maxD + 1];
+    # long durations are capped by T when decoding a whole recording.
     C = frame_rate * 60.0 / max(30.0, min(200.0, hr_bpm))  # frames per cycle
-    # duration priors (in frames)
     s1_mu = max(2.0, min(8.0, 0.06 * C))
     s2_mu = max(2.0, min(8.0, 0.05 * C))
     sys_mu = max(0.15 * C, min(0.45 * C, 0.32 * C))
@@ -129,60 +145,77 @@ def _hsmm_viterbi(E: np.ndarray, frame_rate: float, hr_bpm: float) -> np.ndarray
     mus = [s1_mu, sys_mu, s2_mu, dia_mu]
     sigs = [max(1.5, 0.25 * s1_mu), 0.25 * sys_mu, max(1.5, 0.25 * s2_mu), 0.25 * dia_mu]
     mins = [2, max(2, int(0.10 * C)), 2, max(2, int(0.20 * C))]
-    maxs = [8, max(min(T, int(0.6 * C)), mins[1] + 2), 8, max(min(T, int(1.0 * C)), mins[3] + 2)]
+    sys_max, dia_max = int(0.6 * C), int(1.0 * C)
+    if T is not None:
+        sys_max, dia_max = min(T, sys_max), min(T, dia_max)
+    maxs = [8, max(sys_max, mins[1] + 2), 8, max(dia_max, mins[3] + 2)]
 
-    # Precompute duration log priors for each state and d
     maxD = max(maxs)
+    d_range = np.arange(maxD + 1)
     dur_logp = np.full((4, maxD + 1), -np.inf, dtype=np.float32)
     for s in range(4):
         mu = float(mus[s])
         sig = float(sigs[s]) + 1e-6
-        for d in range(mins[s], maxs[s] + 1):
-            dur_logp[s, d] = -0.5 * ((d - mu) / sig) ** 2
+        ok = (d_range >= mins[s]) & (d_range <= maxs[s])
+        dur_logp[s, ok] = -0.5 * ((d_range[ok] - mu) / sig) ** 2
+    return dur_logp
 
-    # DP arrays
-    dp = np.full((T + 1, 4), -np.inf, dtype=np.float32)
-    ptr_state = -np.ones((T + 1, 4), dtype=np.int16)
-    ptr_dur = np.zeros((T + 1, 4), dtype=np.int16)
 
-    # Allow any start state at t>=mins[s]
-    for s in range(4):
-        dmin, dmax = mins[s], maxs[s]
-        for d in range(dmin, min(dmax, T) + 1):
-            emis = E[:d, s].sum()
-            score = float(dur_logp[s, d] + emis)
-            if score > dp[d, s]:
-                dp[d, s] = score
-                ptr_state[d, s] = -1
-                ptr_dur[d, s] = d
-
-    # transitions: 0->1->2->3->0
-    def prev_state(s: int) -> int:
-        return (s - 1) % 4
+def _hsmm_forward(E: np.ndarray, dur_logp: np.ndarray, prev_state: Optional[int] = None):
+    # Explicit-duration Viterbi recursion. dp[t, s] is the best score of a
+    # segmentation of E[:t] whose last segment (state s) ends exactly at t.
+    # With prev_state set, frame 0 follows a segment of that state, so only
+    # its successor may open the sequence.
+    T = E.shape[0]
+    maxD = dur_logp.shape[1] - 1
+    states = np.arange(4)
+
+    # Emission prefix sums: the score of a segment [a, b) in state s is cum[b, s] - cum[a, s]
+    cum = np.zeros((T + 1, 4), dtype=np.float64)
+    cum[1:] = np.cumsum(E, axis=0, dtype=np.float64)
+    # dur_lp[k] = log prior of duration k + 1, per state
+    dur_lp = dur_logp[:, 1:].T.astype(np.float64)
+    open_mask = np.zeros(4, dtype=np.float64)
+    if prev_state is not None:
+        open_mask[:] = -np.inf
+        open_mask[(int(prev_state) + 1) % 4] = 0.0
+
+    # Segments opening at frame 0 with duration t score start[t]
+    start = np.full((T + 1, 4), -np.inf, dtype=np.float64)
+    n0 = min(maxD, T)
+    start[1:n0 + 1] = dur_lp[:n0] + cum[1:n0 + 1] + open_mask
+
+    # G[t, s] = dp[t, prev[s]] - cum[t, s], so a segment [t - d, t) of state s
+    # scores G[t - d, s] + dur_lp[d - 1, s] + cum[t, s]: one slice per frame
+    dp = np.full((T + 1, 4), -np.inf, dtype=np.float64)
+    G = np.full((T + 1, 4), -np.inf, dtype=np.float64)
+    take = np.zeros((T + 1, 4), dtype=bool)
+    j = np.zeros((T + 1, 4), dtype=np.int64)
 
     for t in range(1, T + 1):
-        for s in range(4):
-            ps = prev_state(s)
-            dmin, dmax = mins[s], maxs[s]
-            dmax2 = min(dmax, t)
-            if dmax2 < dmin:
-                continue
-            # try all durations ending at t
-            best = dp[t, s]
-            best_d = ptr_dur[t, s]
-            for d in range(dmin, dmax2 + 1):
-                prev_t = t - d
-                base = dp[prev_t, ps]
-                if base == -np.inf:
-                    continue
-                emis = E[prev_t:t, s].sum()
-                score = float(base + dur_logp[s, d] + emis)
-                if score > best:
-                    best = score
-                    best_d = d
-                    ptr_state[t, s] = ps
-            dp[t, s] = best
-            ptr_dur[t, s] = best_d
+        D = min(maxD, t)
+        cand = G[t - D:t][::-1] + dur_lp[:D]
+        jt = cand.argmax(axis=0)  # first (shortest) duration on ties
+        best = cand[jt, states] + cum[t]
+        tk = best > start[t]
+        dpt = np.where(tk, best, start[t])
+        dp[t] = dpt
+        G[t] = dpt[_PREV_STATE] - cum[t]
+        take[t] = tk
+        j[t] = jt
+
+    dp_prev = dp[:, _PREV_STATE]
+    t_idx = np.arange(T + 1)[:, None]
+    ptr_state = np.where(take, _PREV_STATE[None, :], -1).astype(np.int16)
+    ptr_dur = np.where(take, j + 1, np.where(np.isfinite(start), t_idx, 0)).astype(np.int16)
+    return dp, dp_prev, cum, ptr_state, ptr_dur
+
+
+def _hsmm_viterbi(E: np.ndarray, frame_rate: float, hr_bpm: float) -> np.ndarray:
+    # E: [T, 4] emission scores; returns best state path (ints 0..3)
+    T = E.shape[0]
+    dur_logp = _duration_logp(frame_rate, hr_bpm, T)
+    dp, _, _, ptr_state, ptr_dur = _hsmm_forward(E, dur_logp)
 
     # best end
     end_t = T
@@ -209,13 +242,28 @@ def _hsmm_viterbi(E: np.ndarray, frame_rate: float, hr_bpm: float) -> np.ndarray
     return path.astype(np.int32)
 
 
-def segment_pcg_hsmm(sample_rate: int, pcm: List[float]) -> Dict[str, Any]:
-    sr = int(sample_rate)
+class HsmmFeatures(NamedTuple):
+    """Front end of segment_pcg_hsmm for one recording, resampled to 2 kHz.
+
+    Build it once with hsmm_features() and hand it to segment_pcg_hsmm (or keep
+    it on a SignalContext) so repeated segmentations of the same signal skip
+    the envelope, frame features and heart-rate autocorrelation.
+    """
+    sr: int
+    hop: int
+    win: int
+    env: np.ndarray       # 50 ms moving-average envelope, per sample
+    env_f: np.ndarray     # envelope at frame centres
+    hf_ratio: np.ndarray  # per-frame 150-400 Hz / 20-150 Hz energy
+    features: np.ndarray  # [T, 4] normalized env, d_env, flux, hf
+    hr_bpm: float
+    hr_salience: float
+
+
+def hsmm_features(sample_rate: int, pcm) -> HsmmFeatures:
     y = np.asarray(pcm, dtype=np.float32)
-    if y.size == 0 or sr <= 0:
-        return {"error": "empty"}
     # resample for consistency
-    y2, sr2 = _resample_to_target(y, sr, 2000)
+    y2, sr2 = _resample_to_target(y, int(sample_rate), 2000)
     # feature extraction per frame
     frames, hop, win = _frame_signal(y2, sr2, 0.02, 0.04)
     mag, flux, hf_ratio = _spectral_features(frames, sr2)
@@ -228,13 +276,26 @@ def segment_pcg_hsmm(sample_rate: int, pcm: List[float]) -> Dict[str, Any]:
     # stack features and normalize
     F = np.stack([env_f, denv_f, flux, hf_ratio], axis=1)
     Fn = _normalize_colwise(F)
-    # HR estimation
-    hr_bpm, hr_sal = _estimate_hr_bpm(y2, sr2)
+    # HR estimation, reusing the envelope
+    hr_bpm, hr_sal = _estimate_hr_bpm(y2, sr2, env=env)
     if not hr_bpm:
         hr_bpm = 75.0
         hr_sal = 0.0
+    return HsmmFeatures(sr2, hop, win, env, env_f, hf_ratio, Fn, float(hr_bpm), float(hr_sal))
+
+
+def segment_pcg_hsmm(sample_rate: int, pcm: List[float], features: Optional[HsmmFeatures] = None) -> Dict[str, Any]:
+    if features is None:
+        sr = int(sample_rate)
+        y = np.asarray(pcm, dtype=np.float32)
+        if y.size == 0 or sr <= 0:
+            return {"error": "empty"}
+        features = hsmm_features(sr, y)
+    sr2, hop, win = features.sr, features.hop, features.win
+    env, env_f, hf_ratio = features.env, features.env_f, features.hf_ratio
+    hr_bpm, hr_sal = features.hr_bpm, features.hr_salience
     # emissions and HSMM
-    E = _emission_scores(Fn)
+    E = _emission_scores(features.features)
     path = _hsmm_viterbi(E, frame_rate=sr2 / hop, hr_bpm=hr_bpm)
     # derive S1/S2 event indices: pick local maxima of env within S1/S2 regions
     s1_frames = np.where(path == 0)[0]
@@ -255,7 +316,7 @@ def segment_pcg_hsmm(sample_rate: int, pcm: List[float]) -> Dict[str, Any]:
             seg = env[a:b]
             if seg.size:
                 pk = int(np.argmax(seg))
-                peaks.append(a + pk)
+                peaks.append(int(a + pk))
             start = t
             prev = t
         # tail
@@ -264,7 +325,7 @@ def segment_pcg_hsmm(sample_rate: int, pcm: List[float]) -> Dict[str, Any]:
         seg = env[a:b]
         if seg.size:
             pk = int(np.argmax(seg))
-            peaks.append(a + pk)
+            peaks.append(int(a + pk))
         return sorted(set(peaks))
 
     s1_idx = peak_from_regions(s1_frames)
@@ -274,20 +335,11 @@ def segment_pcg_hsmm(sample_rate: int, pcm: List[float]) -> Dict[str, Any]:
     s1t = np.array(s1_idx, dtype=np.float64) / sr2 if len(s1_idx) else np.array([], dtype=np.float64)
     s2t = np.array(s2_idx, dtype=np.float64) / sr2 if len(s2_idx) else np.array([], dtype=np.float64)
     rr = np.diff(s1t) if s1t.size >= 2 else np.array([], dtype=np.float64)
-    sys = []
-    dia = []
-    for s1 in s1t:
-        after = s2t[s2t > s1]
-        if after.size:
-            st = after[0] - s1
-            if 0.03 <= st <= 0.8:
-                sys.append(st)
-    for s2 in s2t:
-        after = s1t[s1t > s2]
-        if after.size:
-            dt = after[0] - s2
-            if dt > 0:
-                dia.append(dt)
+    s2_after, has_s2 = first_after(s1t, s2t)
+    st = s2_after[has_s2] - s1t[has_s2]
+    sys = st[(st >= 0.03) & (st <= 0.8)].tolist()
+    s1_after, has_s1 = first_after(s2t, s1t)
+    dia = (s1_after[has_s1] - s2t[has_s1]).tolist()
     ds_ratio = float(np.mean(dia) / np.mean(sys)) if (len(sys) and len(dia)) else None
 
     # SQI: SNR band ratio + HR salience + cycle consistency
@@ -0,0 +1,399 @@
+import heapq
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.signal import firwin, lfilter
+
+from pcg_hsmm import (
+    _duration_logp,
+    _emission_scores,
+    _estimate_hr_bpm,
+    _hsmm_forward,
+    _spectral_features,
+)
+
+# Same framing as segment_pcg_hsmm: 2 kHz, 40 ms windows every 20 ms, 50 ms envelope.
+TARGET_SR = 2000
+_HOP = 40
+_WIN = 80
+_ENV_WIN = 100
+_ENV_BEFORE = _ENV_WIN - 1 - (_ENV_WIN - 1) // 2  # samples before i in np.convolve(mode='same')
+_ENV_AFTER = (_ENV_WIN - 1) // 2                   # samples after i
+# push() works through input in pieces of at most this many seconds so buffers stay bounded
+_MAX_PUSH_SEC = 1.0
+
+
+def _coalesced_frame(dp: np.ndarray, ptr_state: np.ndarray, ptr_dur: np.ndarray, T: int, maxD: int) -> int:
+    # Latest frame through which all surviving paths pass. The open segment at T
+    # can start anywhere in the last maxD frames, so every live node there is a
+    # candidate; follow back-pointers (newest first) until they merge into one.
+    if T <= maxD:
+        return 0
+    ts, ss = np.nonzero(np.isfinite(dp[T - maxD:T]))
+    nodes = [(-(T - maxD + int(t)), int(s)) for t, s in zip(ts, ss)]
+    heapq.heapify(nodes)
+    seen = set(nodes)
+    while len(nodes) > 1:
+        nt, s = heapq.heappop(nodes)
+        ps = int(ptr_state[-nt, s])
+        if ps < 0:
+            return 0
+        node = (nt + int(ptr_dur[-nt, s]), ps)
+        if node not in seen:
+            seen.add(node)
+            heapq.heappush(nodes, node)
+    return -nodes[0][0] if nodes else 0
+
+
+class StreamResampler:
+    """Chunked equivalent of scipy.signal.resample_poly(x, up, down).
+
+    Carries the filter history between calls; the concatenated output of
+    push() + flush() matches resampling the whole signal at once.
+    """
+
+    def __init__(self, sr: int, target_sr: int = TARGET_SR):
+        g = math.gcd(int(target_sr), int(sr))
+        self.up = int(target_sr) // g
+        self.down = int(sr) // g
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            return
+        max_rate = max(self.up, self.down)
+        self.half = 10 * max_rate
+        h = firwin(2 * self.half + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * self.up
+        self.taps = -(-len(h) // self.up)
+        poly = np.zeros(self.taps * self.up)
+        poly[:len(h)] = h
+        # phases[p, k] = h[p + k * up]
+        self.phases = poly.reshape(self.taps, self.up).T.copy()
+        self._buf = np.zeros(0, dtype=np.float64)
+        self._buf0 = 0   # absolute input index of _buf[0]
+        self._n_in = 0
+        self._m = 0      # next output sample
+
+    def _emit(self, last_input: int) -> np.ndarray:
+        # outputs whose newest input sample index is <= last_input
+        m_end = (last_input * self.up + self.up - 1 - self.half) // self.down + 1
+        m_end = min(m_end, -(-self._n_in * self.up // self.down))
+        if m_end <= self._m:
+            return np.zeros(0, dtype=np.float32)
+        m = np.arange(self._m, m_end, dtype=np.int64)
+        q = m * self.down + self.half
+        i0 = q // self.up
+        p = q % self.up
+        idx = i0[:, None] - np.arange(self.taps, dtype=np.int64)[None, :] - self._buf0
+        valid = (idx >= 0) & (idx < len(self._buf))
+        X = np.where(valid, self._buf[np.clip(idx, 0, len(self._buf) - 1)], 0.0)
+        y = np.einsum('mk,mk->m', X, self.phases[p])
+        self._m = int(m_end)
+        # inputs older than the oldest tap of the next output are no longer needed
+        keep_from = (self._m * self.down + self.half) // self.up - self.taps + 1
+        drop = max(0, min(len(self._buf), keep_from - self._buf0))
+        if drop:
+            self._buf = self._buf[drop:]
+            self._buf0 += drop
+        return y.astype(np.float32)
+
+    def push(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        if self.passthrough:
+            return x
+        self._buf = np.concatenate([self._buf, x.astype(np.float64)])
+        self._n_in += len(x)
+        if self._n_in == 0:
+            return np.zeros(0, dtype=np.float32)
+        return self._emit(self._n_in - 1)
+
+    def flush(self) -> np.ndarray:
+        if self.passthrough or self._n_in == 0:
+            return np.zeros(0, dtype=np.float32)
+        # zeros past the end, exactly like the offline filter
+        return self._emit(self._n_in - 1 + self.taps)
+
+
+class StreamingHsmmSegmenter:
+    """Incremental counterpart of segment_pcg_hsmm with fixed-lag decoding.
+
+    push() accepts PCM chunks of any size and returns the cardiac states that
+    are final (at least ``lag_sec`` behind the newest audio) together with the
+    S1/S2 peaks inside them; flush() finalizes the rest at end of recording.
+    Features are normalized online and the heart rate that drives the duration
+    priors is re-estimated over a sliding window, so memory stays bounded by
+    the lag and the HR window however long the recording is.
+
+    Decoding runs on a fixed frame schedule, so the output does not depend on
+    how the input was chunked.
+    """
+
+    def __init__(self, sample_rate: int, lag_sec: float = 5.0, hr_bpm: Optional[float] = None,
+                 warmup_sec: float = 4.0, hr_window_sec: float = 8.0, hr_update_sec: float = 4.0,
+                 norm_window_sec: float = 20.0, decode_every_sec: float = 0.2):
+        sr = int(sample_rate)
+        if sr <= 0:
+            raise ValueError('sample rate must be positive')
+        self.sample_rate = sr
+        self.frame_rate = TARGET_SR / _HOP
+        self.lag_frames = max(1, int(round(lag_sec * self.frame_rate)))
+        self.block = max(1, int(round(decode_every_sec * self.frame_rate)))
+        # warm-up and HR updates land on decode boundaries
+        self.warmup_frames = self.block * max(1, int(round(warmup_sec * self.frame_rate / self.block)))
+        self.hr_update = self.block * max(1, int(round(hr_update_sec * self.frame_rate / self.block)))
+        self.hr_window = int(hr_window_sec * TARGET_SR)
+        self.alpha = 1.0 / max(1.0, norm_window_sec * self.frame_rate)
+        self.fixed_hr = bool(hr_bpm)
+        self.hr_bpm: Optional[float] = float(hr_bpm) if hr_bpm else None
+        self.hr_salience = 0.0
+
+        self._resampler = StreamResampler(sr, TARGET_SR)
+        # resampled signal; begins with the zeros the offline envelope sees before t=0
+        self._x = np.zeros(_ENV_BEFORE, dtype=np.float32)
+        self._x0 = -_ENV_BEFORE      # absolute sample index of _x[0]
+        self._n = 0                  # resampled samples received
+        self._env = np.zeros(0, dtype=np.float32)
+        self._env0 = 0               # absolute sample index of _env[0]
+        self._next_frame = 0
+        self._last_frame: Optional[np.ndarray] = None
+        self._last_env_f: Optional[float] = None
+        self._raw: List[np.ndarray] = []    # features not yet normalized/decoded
+        self._raw0 = 0                      # absolute frame index of the first pending row
+        self._mu: Optional[np.ndarray] = None
+        self._var: Optional[np.ndarray] = None
+        self._dur_logp: Optional[np.ndarray] = None
+        self._E = np.zeros((0, 4), dtype=np.float32)
+        self._b = 0                         # committed frames (absolute boundary)
+        self._prev_state: Optional[int] = None
+        self._flushed = False
+
+    # -- signal and features -------------------------------------------------
+
+    def _append_samples(self, y2: np.ndarray, final: bool = False):
+        if len(y2):
+            self._x = np.concatenate([self._x, y2])
+            self._n += len(y2)
+        # envelope up to the newest sample whose moving-average window is complete
+        env_end = self._n if final else self._n - _ENV_AFTER
+        env_start = self._env0 + len(self._env)
+        if env_end > env_start:
+            pad = _ENV_AFTER if final else 0
+            src = self._x[env_start - _ENV_BEFORE - self._x0:]
+            if pad:
+                src = np.concatenate([src, np.zeros(pad, dtype=np.float32)])
+            w = np.full(_ENV_WIN, 1.0 / _ENV_WIN, dtype=np.float32)
+            env = np.convolve(np.abs(src), w, mode='valid')[:env_end - env_start]
+            self._env = np.concatenate([self._env, env.astype(np.float32, copy=False)])
+        # frames whose samples and centre envelope are both available
+        env_avail = self._env0 + len(self._env)
+        last = min((self._n - _WIN) // _HOP, (env_avail - 1 - _WIN // 2) // _HOP) if self._n >= _WIN else -1
+        if last >= self._next_frame:
+            t = np.arange(self._next_frame, last + 1)
+            off = self._next_frame * _HOP - self._x0
+            seg = self._x[off:off + (len(t) - 1) * _HOP + _WIN]
+            frames = np.lib.stride_tricks.sliding_window_view(seg, _WIN)[::_HOP]
+            # the previous frame rides along so spectral flux continues across calls
+            if self._last_frame is not None:
+                frames = np.concatenate([self._last_frame[None, :], frames])
+            _, flux, hf = _spectral_features(frames, TARGET_SR)
+            if self._last_frame is not None:
+                flux, hf = flux[1:], hf[1:]
+            self._last_frame = frames[-1].copy()
+            env_f = self._env[t * _HOP + _WIN // 2 - self._env0]
+            first = env_f[:1] if self._last_env_f is None else np.array([self._last_env_f], dtype=np.float32)
+            denv = np.diff(env_f, prepend=first)
+            self._last_env_f = float(env_f[-1])
+            self._raw.append(np.stack([env_f, denv, flux, hf], axis=1).astype(np.float32))
+            self._next_frame = last + 1
+        # keep what the next envelope values, frames and HR estimate still need,
+        # and the envelope of frames not yet committed
+        keep = min(self._env0 + len(self._env) - _ENV_BEFORE, self._next_frame * _HOP,
+                   self._raw0 * _HOP - self.hr_window)
+        drop = max(0, keep - self._x0)
+        if drop:
+            self._x = self._x[drop:]
+            self._x0 += drop
+        drop = max(0, min(len(self._env), self._b * _HOP - self._env0))
+        if drop:
+            self._env = self._env[drop:]
+            self._env0 += drop
+
+    def _pending_frames(self) -> int:
+        return sum(len(r) for r in self._raw)
+
+    def _take_raw(self, n: int) -> np.ndarray:
+        F = np.concatenate(self._raw) if len(self._raw) > 1 else self._raw[0]
+        self._raw = [F[n:]] if n < len(F) else []
+        self._raw0 += n
+        return F[:n]
+
+    def _normalize(self, F: np.ndarray) -> np.ndarray:
+        # exponentially weighted mean/variance per feature, carried across blocks
+        a = self.alpha
+        mu = lfilter([a], [1.0, a - 1.0], F, axis=0, zi=((1.0 - a) * self._mu)[None, :])[0]
+        mu_before = np.vstack([self._mu[None, :], mu[:-1]])
+        dev2 = (F - mu_before) ** 2
+        var = lfilter([a], [1.0, a - 1.0], dev2, axis=0, zi=((1.0 - a) * self._var)[None, :])[0]
+        self._mu, self._var = mu[-1], var[-1]
+        Z = np.clip((F - mu) / (np.sqrt(var) + 1e-6), -3.0, 3.0)
+        return ((Z + 3.0) / 6.0).astype(np.float32)
+
+    def _hr_signal(self, frame: int) -> np.ndarray:
+        end = frame * _HOP
+        a = max(0, end - self.hr_window)
+        return self._x[max(0, a - self._x0):max(0, end - self._x0)]
+
+    def _update_hr(self, frame: int):
+        if self.fixed_hr:
+            if self._dur_logp is None:
+                self._dur_logp = _duration_logp(self.frame_rate, self.hr_bpm)
+            return
+        hr, sal = _estimate_hr_bpm(self._hr_signal(frame), TARGET_SR)
+        if hr and (self.hr_bpm is None or sal >= 0.1):
+            self.hr_bpm, self.hr_salience = float(hr), float(sal)
+        if self.hr_bpm is None:
+            self.hr_bpm = 75.0
+        self._dur_logp = _duration_logp(self.frame_rate, self.hr_bpm)
+
+    # -- decoding ------------------------------------------------------------
+
+    def _decode(self, final: bool) -> Tuple[List[Tuple[int, int, int]], List[int], List[int]]:
+        T = len(self._E)
+        if T == 0:
+            return [], [], []
+        dur_logp = self._dur_logp
+        dp, dp_prev, cum, ptr_state, ptr_dur = _hsmm_forward(self._E, dur_logp, self._prev_state)
+        # the newest segment is still open: score it by the probability its duration reaches d
+        maxD = dur_logp.shape[1] - 1
+        D = min(maxD, T)
+        surv = np.logaddexp.accumulate(dur_logp[:, ::-1].astype(np.float64), axis=1)[:, ::-1][:, 1:D + 1].T
+        cand = dp_prev[T - D:T][::-1] + surv + (cum[T] - cum[T - D:T][::-1])
+        # or a single segment may span the whole buffer
+        opener = np.full(4, -np.inf)
+        if T <= maxD:
+            opener = surv[T - 1] + cum[T]
+            if self._prev_state is not None:
+                opener[np.arange(4) != (self._prev_state + 1) % 4] = -np.inf
+        j = np.argmax(cand, axis=0)
+        best = cand[j, np.arange(4)]
+        end_s = int(np.argmax(np.maximum(best, opener)))
+        if opener[end_s] >= best[end_s]:
+            segs = [(end_s, 0, T)]
+        else:
+            d = int(j[end_s]) + 1
+            segs = [(end_s, T - d, T)]
+            t, s = T - d, int((end_s + 3) % 4)
+            while t > 0:
+                d = int(ptr_dur[t, s])
+                if d <= 0:
+                    break
+                segs.append((s, t - d, t))
+                ps = int(ptr_state[t, s])
+                if ps < 0:
+                    break
+                t, s = t - d, ps
+        segs.reverse()
+        # commit what every surviving path agrees on, and anything lag frames old regardless
+        limit = T if final else max(T - self.lag_frames, _coalesced_frame(dp, ptr_state, ptr_dur, T, maxD))
+        out = [(s, self._b + a, self._b + b) for s, a, b in segs if b <= limit]
+        if not out or segs[0][1] != 0:
+            return [], [], []
+        n_commit = out[-1][2] - self._b
+        s1, s2 = self._event_peaks(out, final)
+        self._E = self._E[n_commit:]
+        self._b += n_commit
+        self._prev_state = out[-1][0]
+        return out, s1, s2
+
+    def _event_peaks(self, segs, final: bool) -> Tuple[List[int], List[int]]:
+        # envelope maximum inside every S1 / S2 segment, as in segment_pcg_hsmm
+        s1, s2 = [], []
+        env_end = self._env0 + len(self._env)
+        limit = self._n - 1 if final else env_end
+        for s, a, b in segs:
+            if s not in (0, 2):
+                continue
+            lo = a * _HOP
+            hi = min(limit, (b - 1) * _HOP + _WIN, env_end)
+            seg = self._env[lo - self._env0:hi - self._env0]
+            if seg.size:
+                (s1 if s == 0 else s2).append(int(lo + int(np.argmax(seg))))
+        return s1, s2
+
+    def _advance(self, final: bool = False) -> Dict[str, Any]:
+        segs: List[Tuple[int, int, int]] = []
+        s1: List[int] = []
+        s2: List[int] = []
+
+        def collect(r):
+            segs.extend(r[0])
+            s1.extend(r[1])
+            s2.extend(r[2])
+
+        while True:
+            pending = self._pending_frames()
+            if self._mu is None:
+                # warm-up: batch statistics and the first HR estimate over the opening frames
+                if pending == 0 or (pending < self.warmup_frames and not final):
+                    break
+                F = self._take_raw(min(pending, self.warmup_frames))
+                self._mu = np.nanmean(F, axis=0)
+                self._var = np.nanvar(F, axis=0)
+                Z = np.clip((F - self._mu) / (np.sqrt(self._var) + 1e-6), -3.0, 3.0)
+                E = _emission_scores(((Z + 3.0) / 6.0).astype(np.float32))
+                self._update_hr(self._raw0)
+            else:
+                to_boundary = self.block - self._raw0 % self.block
+                if pending < to_boundary:
+                    if not (final and pending):
+                        break
+                    to_boundary = pending
+                E = _emission_scores(self._normalize(self._take_raw(to_boundary)))
+                if not self.fixed_hr and self._raw0 % self.hr_update == 0:
+                    self._update_hr(self._raw0)
+            self._E = np.concatenate([self._E, E])
+            collect(self._decode(final=False))
+        if final:
+            collect(self._decode(final=True))
+        return {
+            'hrBpm': self.hr_bpm,
+            'finalizedFrames': self._b,
+            'segments': [[int(s), int(a), int(b)] for s, a, b in segs],
+            's1': s1,
+            's2': s2,
+        }
+
+    # -- public API ----------------------------------------------------------
+
+    def push(self, chunk) -> Dict[str, Any]:
+        """Feed PCM samples; returns newly finalized segments and S1/S2 events.
+
+        ``segments`` are ``[state, startFrame, endFrame)`` triples with states
+        0=S1, 1=systole, 2=S2, 3=diastole at ``frameRate`` frames per second;
+        ``s1`` / ``s2`` are sample indices at 2 kHz, like segment_pcg_hsmm.
+        """
+        if self._flushed:
+            raise RuntimeError('segmenter already flushed')
+        x = np.asarray(chunk, dtype=np.float32).ravel()
+        step = max(1, int(_MAX_PUSH_SEC * self.sample_rate))
+        merged: Optional[Dict[str, Any]] = None
+        for a in range(0, max(1, len(x)), step):
+            self._append_samples(self._resampler.push(x[a:a + step]))
+            merged = self._merge(merged, self._advance())
+        return merged
+
+    def flush(self) -> Dict[str, Any]:
+        """Finalize everything still pending at the end of the recording."""
+        if self._flushed:
+            raise RuntimeError('segmenter already flushed')
+        self._flushed = True
+        self._append_samples(self._resampler.flush(), final=True)
+        return self._advance(final=True)
+
+    @staticmethod
+    def _merge(acc: Optional[Dict[str, Any]], res: Dict[str, Any]) -> Dict[str, Any]:
+        if acc is None:
+            return res
+        res['segments'] = acc['segments'] + res['segments']
+        res['s1'] = acc['s1'] + res['s1']
+        res['s2'] = acc['s2'] + res['s2']
+        return res
@@ -0,0 +1,134 @@
+import inspect
+import typing
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+from pydantic.fields import FieldInfo
+from pydantic_core import PydanticUndefined
+from starlette.requests import Request
+
+# Raw little-endian PCM bodies (Content-Type: application/octet-stream).
+# Sample rate and encoding come from headers or query params, every other
+# endpoint argument from the query string (e.g. ?startSec=1&width=800).
+OCTET_STREAM = 'application/octet-stream'
+SAMPLE_RATE_HEADER = 'X-Sample-Rate'
+ENCODING_HEADER = 'X-PCM-Encoding'
+
+_ENCODINGS = {
+    'float32': np.dtype('<f4'),
+    'f32le': np.dtype('<f4'),
+    'int16': np.dtype('<i2'),
+    's16le': np.dtype('<i2'),
+}
+
+
+class PcmBodyError(ValueError):
+    pass
+
+
+def is_binary_pcm(request: Request) -> bool:
+    ctype = (request.headers.get('content-type') or '').split(';')[0].strip().lower()
+    return ctype == OCTET_STREAM
+
+
+def decode_pcm_bytes(data: bytes, encoding: Optional[str]) -> np.ndarray:
+    enc = (encoding or 'float32').strip().lower()
+    dtype = _ENCODINGS.get(enc)
+    if dtype is None:
+        raise PcmBodyError(f'unsupported pcm encoding: {encoding}')
+    if len(data) % dtype.itemsize:
+        raise PcmBodyError('pcm body length is not a multiple of the sample size')
+    # float32 is a zero-copy, read-only view over the request body
+    x = np.frombuffer(data, dtype=dtype)
+    if dtype.kind == 'i':
+        return x.astype(np.float32) / 32768.0
+    return x.astype(np.float32, copy=False)
+
+
+def _param_default(param: inspect.Parameter) -> Any:
+    default = param.default
+    if isinstance(default, FieldInfo):
+        default = default.default
+    if default is inspect.Parameter.empty or default is PydanticUndefined or default is Ellipsis:
+        return PydanticUndefined
+    return default
+
+
+def _unwrap(annotation: Any) -> Any:
+    # Annotated[T, Body()] -> T
+    if typing.get_origin(annotation) is typing.Annotated:
+        return typing.get_args(annotation)[0]
+    return annotation
+
+
+def _is_list(annotation: Any) -> bool:
+    annotation = _unwrap(annotation)
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        return any(_is_list(a) for a in typing.get_args(annotation) if a is not type(None))
+    return origin in (list, typing.List)
+
+
+def _query_value(request: Request, name: str, annotation: Any) -> Any:
+    if _is_list(annotation):
+        values = []
+        for raw in request.query_params.getlist(name):
+            values.extend(v.strip() for v in raw.split(',') if v.strip())
+        return values if values else PydanticUndefined
+    raw = request.query_params.get(name)
+    return PydanticUndefined if raw is None else raw
+
+
+async def binary_pcm_kwargs(request: Request, endpoint: Callable) -> Dict[str, Any]:
+    sr_raw = request.headers.get(SAMPLE_RATE_HEADER) or request.query_params.get('sampleRate')
+    if not sr_raw:
+        raise PcmBodyError(f'missing sample rate ({SAMPLE_RATE_HEADER} header or sampleRate query)')
+    encoding = request.headers.get(ENCODING_HEADER) or request.query_params.get('encoding')
+    y = decode_pcm_bytes(await request.body(), encoding)
+
+    kwargs: Dict[str, Any] = {}
+    for name, param in inspect.signature(endpoint).parameters.items():
+        if name == 'pcm':
+            kwargs[name] = y
+            continue
+        if name == 'authorization':
+            kwargs[name] = request.headers.get('authorization')
+            continue
+        raw = sr_raw if name == 'sampleRate' else _query_value(request, name, param.annotation)
+        if raw is PydanticUndefined:
+            default = _param_default(param)
+            if default is PydanticUndefined:
+                raise PcmBodyError(f'missing query parameter: {name}')
+            kwargs[name] = default
+            continue
+        try:
+            kwargs[name] = TypeAdapter(_unwrap(param.annotation)).validate_python(raw)
+        except Exception:
+            raise PcmBodyError(f'invalid query parameter: {name}')
+    return kwargs
+
+
+class BinaryPcmRoute(APIRoute):
+    """Route that also accepts the PCM payload as a raw octet-stream body."""
+
+    def get_route_handler(self) -> Callable:
+        json_handler = super().get_route_handler()
+        endpoint = self.endpoint
+
+        async def handler(request: Request) -> Response:
+            if not is_binary_pcm(request):
+                return await json_handler(request)
+            try:
+                kwargs = await binary_pcm_kwargs(request, endpoint)
+            except PcmBodyError as e:
+                return JSONResponse({'error': str(e)}, status_code=400)
+            res = await endpoint(**kwargs)
+            if isinstance(res, Response):
+                return res
+            return JSONResponse(content=jsonable_encoder(res))
+
+        return handler
@@ -0,0 +1,110 @@
+import struct
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+
+def minmax_reduce(lo: np.ndarray, hi: np.ndarray, edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Min of lo and max of hi over each span [edges[i], edges[i+1]).
+
+    Edges must be non-decreasing; an empty span takes the value at its start
+    (np.ufunc.reduceat semantics), so zoomed-in columns repeat the nearest
+    sample instead of dropping to zero.
+    """
+    stop = max(1, int(edges[-1]))
+    idx = np.minimum(edges[:-1], stop - 1)
+    return np.minimum.reduceat(lo[:stop], idx), np.maximum.reduceat(hi[:stop], idx)
+
+
+def column_edges(start: int, end: int, cols: int) -> np.ndarray:
+    return start + np.linspace(0, end - start, num=cols + 1).astype(np.int64)
+
+
+class PeakPyramid(NamedTuple):
+    """Min/max peaks at base, 2·base, 4·base, ... samples per peak, as int16 times scale.
+
+    The multi-resolution analogue of an audiowaveform .dat file: any zoom
+    reads the level just finer than its samples-per-pixel instead of
+    rescanning the signal.
+    """
+    mins: List[np.ndarray]
+    maxs: List[np.ndarray]
+    base: int
+    scale: float
+    n: int
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.mins) + sum(a.nbytes for a in self.maxs)
+
+    @property
+    def peak(self) -> float:
+        # largest |sample| in the recording, read off the coarsest level
+        if not self.n:
+            return 0.0
+        return max(-int(self.mins[-1].min()), int(self.maxs[-1].max())) * self.scale
+
+
+def build_peak_pyramid(y: np.ndarray, base: int = 16, min_len: int = 64) -> PeakPyramid:
+    y = np.asarray(y, dtype=np.float32)
+    n = len(y)
+    peak = float(np.max(np.abs(y))) if n else 0.0
+    scale = peak / 32767.0 if peak > 0 else 1.0
+    lo, hi = minmax_reduce(y, y, np.append(np.arange(0, n, base), n)) if n else (y, y)
+    mins = [np.rint(lo / scale).astype(np.int16)]
+    maxs = [np.rint(hi / scale).astype(np.int16)]
+    while mins[-1].size > min_len:
+        m, x = mins[-1], maxs[-1]
+        pairs = np.append(np.arange(0, m.size, 2), m.size)
+        lo, hi = minmax_reduce(m, x, pairs)
+        mins.append(lo)
+        maxs.append(hi)
+    return PeakPyramid(mins, maxs, int(base), scale, n)
+
+
+def peak_columns(pyr: PeakPyramid, y: np.ndarray, start: int, end: int, cols: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-column (min, max) amplitudes of y[start:end] drawn `cols` pixels wide.
+
+    Reads the coarsest pyramid level whose peaks are no wider than a column,
+    or the samples themselves when zoomed in past the finest level. Columns
+    may overlap by one peak where a boundary falls inside it.
+    """
+    cols = max(1, int(cols))
+    spc = (end - start) / float(cols)
+    if spc < pyr.base:
+        y = np.asarray(y, dtype=np.float32)
+        return minmax_reduce(y, y, column_edges(start, end, cols))
+    level = min(len(pyr.mins) - 1, int(np.log2(spc / pyr.base)))
+    spp = pyr.base << level
+    mins, maxs = pyr.mins[level], pyr.maxs[level]
+    bounds = column_edges(start, end, cols)
+    edges = bounds // spp
+    edges[-1] = -(-end // spp)
+    lo, hi = minmax_reduce(mins, maxs, edges)
+    # a column ending mid-peak also takes that peak, so no sample is left out of its own column
+    tail = np.flatnonzero(bounds[1:-1] % spp)
+    if tail.size:
+        lo[tail] = np.minimum(lo[tail], mins[edges[1:-1][tail]])
+        hi[tail] = np.maximum(hi[tail], maxs[edges[1:-1][tail]])
+    return lo.astype(np.float32) * pyr.scale, hi.astype(np.float32) * pyr.scale
+
+
+def quantize_peaks(lo: np.ndarray, hi: np.ndarray, bits: int, peak: float = 1.0) -> np.ndarray:
+    """Interleaved min/max at full scale for the bit depth, as in audiowaveform data.
+
+    Amplitudes in [-1, 1] map to full scale directly; a louder recording
+    (peak > 1) is divided by its peak instead of clipping, so its loudest
+    sample lands on full scale.
+    """
+    full = 127.0 if bits == 8 else 32767.0
+    gain = full / max(1.0, float(peak))
+    out = np.empty(lo.size * 2, dtype=np.int8 if bits == 8 else '<i2')
+    out[0::2] = np.clip(np.rint(lo * gain), -full - 1, full)
+    out[1::2] = np.clip(np.rint(hi * gain), -full - 1, full)
+    return out
+
+
+def encode_dat(data: np.ndarray, sample_rate: int, samples_per_pixel: int, bits: int) -> bytes:
+    # audiowaveform .dat version 1 header: version, flags (1 = 8-bit), rate, samples/pixel, length
+    header = struct.pack('<iIiiI', 1, 1 if bits == 8 else 0, int(sample_rate), int(samples_per_pixel), data.size // 2)
+    return header + data.tobytes()
@@ -0,0 +1,238 @@
+import struct
+import zlib
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# Matplotlib-free PNG rendering for spectrograms and waveforms. The dB matrix
+# goes through a fixed 256-entry magma table, is resampled to the target size
+# in NumPy and written as a PNG with zlib. Axes and colorbar are drawn as
+# optional pixel overlays using a tiny built-in bitmap font.
+
+# matplotlib 'magma' sampled at 256 points, RGB bytes
+_MAGMA_HEX = (
+    '00000401000501010601010802010902020b02020d03030f03031204041405041606051806051a07061c08071e090720'
+    '0a08220b09240c09260d0a290e0b2b100b2d110c2f120d31130d34140e36150e38160f3b180f3d19103f1a10421c1044'
+    '1d11471e114920114b21114e22115024125325125527125829115a2a115c2c115f2d11612f1163311165331067341069'
+    '36106b38106c390f6e3b0f703d0f713f0f72400f74420f75440f764510774710784910784a10794c117a4e117b4f127b'
+    '51127c52137c54137d56147d57157e59157e5a167e5c167f5d177f5f187f601880621980641a80651a80671b80681c81'
+    '6a1c816b1d816d1d816e1e81701f81721f817320817521817621817822817922827b23827c23827e2482802582812581'
+    '8326818426818627818827818928818b29818c29818e2a81902a81912b81932b80942c80962c80982d80992d809b2e7f'
+    '9c2e7f9e2f7fa02f7fa1307ea3307ea5317ea6317da8327daa337dab337cad347cae347bb0357bb2357bb3367ab5367a'
+    'b73779b83779ba3878bc3978bd3977bf3a77c03a76c23b75c43c75c53c74c73d73c83e73ca3e72cc3f71cd4071cf4070'
+    'd0416fd2426fd3436ed5446dd6456cd8456cd9466bdb476adc4869de4968df4a68e04c67e24d66e34e65e44f64e55064'
+    'e75263e85362e95462ea5661eb5760ec5860ed5a5fee5b5eef5d5ef05f5ef1605df2625df2645cf3655cf4675cf4695c'
+    'f56b5cf66c5cf66e5cf7705cf7725cf8745cf8765cf9785df9795df97b5dfa7d5efa7f5efa815ffb835ffb8560fb8761'
+    'fc8961fc8a62fc8c63fc8e64fc9065fd9266fd9467fd9668fd9869fd9a6afd9b6bfe9d6cfe9f6dfea16efea36ffea571'
+    'fea772fea973feaa74feac76feae77feb078feb27afeb47bfeb67cfeb77efeb97ffebb81febd82febf84fec185fec287'
+    'fec488fec68afec88cfeca8dfecc8ffecd90fecf92fed194fed395fed597fed799fed89afdda9cfddc9efddea0fde0a1'
+    'fde2a3fde3a5fde5a7fde7a9fde9aafdebacfcecaefceeb0fcf0b2fcf2b4fcf4b6fcf6b8fcf7b9fcf9bbfcfbbdfcfdbf'
+)
+MAGMA_LUT = np.frombuffer(bytes.fromhex(_MAGMA_HEX), dtype=np.uint8).reshape(256, 3)
+
+_WHITE = np.array([255, 255, 255], dtype=np.uint8)
+_INK = np.array([40, 40, 40], dtype=np.uint8)
+
+# 3x5 glyphs, enough for tick labels and units
+_GLYPHS = {
+    '0': ('111', '101', '101', '101', '111'),
+    '1': ('010', '110', '010', '010', '111'),
+    '2': ('111', '001', '111', '100', '111'),
+    '3': ('111', '001', '111', '001', '111'),
+    '4': ('101', '101', '111', '001', '001'),
+    '5': ('111', '100', '111', '001', '111'),
+    '6': ('111', '100', '111', '101', '111'),
+    '7': ('111', '001', '010', '010', '010'),
+    '8': ('111', '101', '111', '101', '111'),
+    '9': ('111', '101', '111', '001', '111'),
+    '.': ('000', '000', '000', '000', '010'),
+    '-': ('000', '000', '111', '000', '000'),
+    ' ': ('000', '000', '000', '000', '000'),
+    's': ('000', '011', '110', '011', '110'),
+    'H': ('101', '101', '111', '101', '101'),
+    'z': ('000', '111', '011', '110', '111'),
+    'd': ('001', '001', '111', '101', '111'),
+    'B': ('110', '101', '110', '101', '110'),
+}
+_FONT_SCALE = 2
+_GLYPH_W = 3 * _FONT_SCALE
+_GLYPH_H = 5 * _FONT_SCALE
+_MIN_PLOT = 8
+_GLYPH_BITMAPS = {
+    ch: np.kron(np.array([[c == '1' for c in row] for row in rows], dtype=bool),
+                np.ones((_FONT_SCALE, _FONT_SCALE), dtype=bool))
+    for ch, rows in _GLYPHS.items()
+}
+
+
+def encode_png(rgb: np.ndarray, level: int = 3) -> bytes:
+    img = np.ascontiguousarray(rgb, dtype=np.uint8)
+    h, w, ch = img.shape
+    color_type = {1: 0, 3: 2, 4: 6}[ch]
+    # filter type 0 (None) on every scanline
+    raw = np.zeros((h, w * ch + 1), dtype=np.uint8)
+    raw[:, 1:] = img.reshape(h, w * ch)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    ihdr = struct.pack('>IIBBBBB', w, h, 8, color_type, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr)
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) + chunk(b'IEND', b''))
+
+
+def _resample_axis(a: np.ndarray, size: int, axis: int) -> np.ndarray:
+    n = a.shape[axis]
+    size = max(1, int(size))
+    if n == size:
+        return a
+    if n > 2 * size:
+        # box-average down to ~2x the target first so long recordings do not alias
+        k = n // (2 * size)
+        m = (n // k) * k
+        a = np.take(a, np.arange(m), axis=axis)
+        shape = list(a.shape)
+        shape[axis:axis + 1] = [m // k, k]
+        a = a.reshape(shape).mean(axis=axis + 1)
+        n = a.shape[axis]
+    # linear interpolation at pixel centres
+    pos = (np.arange(size) + 0.5) * (n / size) - 0.5
+    pos = np.clip(pos, 0, n - 1)
+    i0 = np.floor(pos).astype(np.int64)
+    i1 = np.minimum(i0 + 1, n - 1)
+    wt = (pos - i0).astype(np.float32)
+    shape = [1] * a.ndim
+    shape[axis] = size
+    wt = wt.reshape(shape)
+    return np.take(a, i0, axis=axis) * (1.0 - wt) + np.take(a, i1, axis=axis) * wt
+
+
+def resample_2d(m: np.ndarray, height: int, width: int) -> np.ndarray:
+    m = np.asarray(m, dtype=np.float32)
+    return _resample_axis(_resample_axis(m, height, 0), width, 1)
+
+
+def colorize(m: np.ndarray, vmin: Optional[float] = None, vmax: Optional[float] = None,
+             lut: np.ndarray = MAGMA_LUT) -> np.ndarray:
+    lo = float(np.min(m)) if vmin is None else float(vmin)
+    hi = float(np.max(m)) if vmax is None else float(vmax)
+    scale = (len(lut) / (hi - lo)) if hi > lo else 0.0
+    idx = np.clip(((m - lo) * scale).astype(np.int32), 0, len(lut) - 1)
+    return lut[idx]
+
+
+def _nice_ticks(lo: float, hi: float, target: int = 6) -> np.ndarray:
+    span = hi - lo
+    if span <= 0:
+        return np.array([lo])
+    raw = span / max(1, target)
+    mag = 10.0 ** np.floor(np.log10(raw))
+    step = mag * min((s for s in (1.0, 2.0, 5.0, 10.0) if s * mag >= raw), default=10.0)
+    start = np.ceil(lo / step) * step
+    return np.arange(start, hi + step * 1e-6, step)
+
+
+def _fmt_tick(v: float) -> str:
+    if abs(v - round(v)) < 1e-6:
+        return str(int(round(v)))
+    return f'{v:.1f}'
+
+
+def draw_text(img: np.ndarray, text: str, x: int, y: int, color: np.ndarray = _INK):
+    h, w = img.shape[:2]
+    for ch in text:
+        glyph = _GLYPH_BITMAPS.get(ch)
+        if glyph is not None:
+            gy0, gx0 = max(0, y), max(0, x)
+            gy1, gx1 = min(h, y + _GLYPH_H), min(w, x + _GLYPH_W)
+            if gy1 > gy0 and gx1 > gx0:
+                mask = glyph[gy0 - y:gy1 - y, gx0 - x:gx1 - x]
+                img[gy0:gy1, gx0:gx1][mask] = color
+        x += _GLYPH_W + _FONT_SCALE
+
+
+def text_width(text: str) -> int:
+    return len(text) * (_GLYPH_W + _FONT_SCALE) - _FONT_SCALE if text else 0
+
+
+def _blend(img: np.ndarray, color: np.ndarray, alpha: float):
+    img[...] = (img.astype(np.float32) * (1.0 - alpha) + color.astype(np.float32) * alpha).astype(np.uint8)
+
+
+def render_spectrogram_png(S_db: np.ndarray, extent: Sequence[float], width: int, height: int,
+                           axes: bool = True, colorbar: bool = True) -> bytes:
+    # S_db: (freq_bins, frames) with row 0 = lowest frequency; extent = [t0, t1, f0, f1]
+    width = max(16, int(width))
+    height = max(16, int(height))
+    bar_w = 10
+    # shed decorations that would leave less than _MIN_PLOT px of plot: axes first, then colorbar
+    while True:
+        left = 8 + text_width('0000') if axes else 0
+        bottom = 6 + _GLYPH_H if axes else 0
+        top = _GLYPH_H + 4 if (axes or colorbar) else 0
+        bar_block = (6 + bar_w + 6 + text_width('-000')) if colorbar else 0
+        plot_w = width - left - bar_block - (4 if axes else 0)
+        plot_h = height - bottom - top
+        if (plot_w >= _MIN_PLOT and plot_h >= _MIN_PLOT) or not (axes or colorbar):
+            break
+        if axes:
+            axes = False
+        else:
+            colorbar = False
+
+    vmin = float(np.min(S_db)) if S_db.size else 0.0
+    vmax = float(np.max(S_db)) if S_db.size else 1.0
+    plot = resample_2d(S_db[::-1, :], plot_h, plot_w) if S_db.size else np.zeros((plot_h, plot_w), np.float32)
+    plot_rgb = colorize(plot, vmin, vmax)
+
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[...] = _WHITE
+    img[top:top + plot_h, left:left + plot_w] = plot_rgb
+
+    if axes:
+        t0, t1, f0, f1 = (float(v) for v in extent)
+        region = img[top:top + plot_h, left:left + plot_w]
+        for tv in _nice_ticks(t0, t1):
+            px = int(round((tv - t0) / (t1 - t0) * (plot_w - 1))) if t1 > t0 else 0
+            _blend(region[:, px:px + 1], _WHITE, 0.2)
+            img[top + plot_h:top + plot_h + 3, left + px] = _INK
+            label = _fmt_tick(tv)
+            lx = min(width - text_width(label), max(0, left + px - text_width(label) // 2))
+            draw_text(img, label, lx, top + plot_h + 5)
+        for fv in _nice_ticks(f0, f1, target=5):
+            py = plot_h - 1 - int(round((fv - f0) / (f1 - f0) * (plot_h - 1))) if f1 > f0 else plot_h - 1
+            _blend(region[py:py + 1, :], _WHITE, 0.2)
+            img[top + py, max(0, left - 3):left] = _INK
+            label = _fmt_tick(fv)
+            draw_text(img, label, max(0, left - 5 - text_width(label)), top + py - _GLYPH_H // 2)
+        # unit labels sit in the margins, clear of the tick labels
+        draw_text(img, 'Hz', left + 3, 1)
+        draw_text(img, 's', max(0, left - 8 - _GLYPH_W), top + plot_h + 5)
+
+    if colorbar:
+        bx = left + plot_w + (4 if axes else 0) + 6
+        ramp = np.linspace(vmax, vmin, plot_h, dtype=np.float32)[:, None]
+        img[top:top + plot_h, bx:bx + bar_w] = colorize(np.repeat(ramp, bar_w, axis=1), vmin, vmax)
+        for dv in _nice_ticks(vmin, vmax, target=4):
+            py = int(round((vmax - dv) / (vmax - vmin) * (plot_h - 1))) if vmax > vmin else 0
+            img[top + py, bx + bar_w:bx + bar_w + 3] = _INK
+            draw_text(img, _fmt_tick(dv), bx + bar_w + 5, top + py - _GLYPH_H // 2)
+        draw_text(img, 'dB', max(0, bx - 2 - text_width('dB')), 1)
+    return encode_png(img)
+
+
+def render_waveform_png(env: np.ndarray, width: int, height: int,
+                        color: Tuple[int, int, int] = (0x0e, 0xa5, 0xe9), alpha: float = 0.9) -> bytes:
+    # env: per-column peak amplitude in [0, 1], filled symmetrically around zero
+    width = max(1, int(width))
+    height = max(1, int(height))
+    env = np.asarray(env, dtype=np.float32)
+    if env.size != width:
+        env = _resample_axis(env, width, 0) if env.size else np.zeros(width, np.float32)
+    yy = np.abs(np.linspace(1.05, -1.05, height, dtype=np.float32))
+    fill = yy[:, None] <= env[None, :]
+    fg = np.round(np.asarray(color, dtype=np.float32) * alpha + 255.0 * (1.0 - alpha)).astype(np.uint8)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[...] = _WHITE
+    img[fill] = fg
+    return encode_png(img)
@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def _size_of(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    # JSON-able analysis results: their serialized size is a fair proxy
+    return len(json.dumps(value, separators=(',', ':'), default=str))
+
+
+class ResultCache:
+    """In-process LRU cache bounded by total value size, with per-entry TTL.
+
+    Values are treated as immutable: callers must not modify what they get back.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20, ttl: Optional[float] = 3600.0):
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = ttl if (ttl and ttl > 0) else None
+        self._data: 'OrderedDict[str, Tuple[Any, int, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> 'ResultCache':
+        return cls(
+            max_bytes=int(float(os.getenv('VIZ_CACHE_MAX_MB', '64')) * (1 << 20)),
+            ttl=float(os.getenv('VIZ_CACHE_TTL', '3600')),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _drop(self, key: str):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[2] < time.monotonic():
+                self._drop(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: str, value: Any, size: Optional[int] = None):
+        if not self.enabled or value is None:
+            return
+        size = _size_of(value) if size is None else int(size)
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else float('inf')
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, size, expires)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'ttlSec': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': (self.hits / lookups) if lookups else None,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,142 @@
+from typing import List, Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def _templates(x: np.ndarray, m: int, count: int) -> np.ndarray:
+    return np.lib.stride_tricks.sliding_window_view(x, m)[:count]
+
+
+def _match_fraction(x: np.ndarray, m: int, r: float) -> float:
+    # Share of pairs among the first N-m length-m templates closer than r (Chebyshev, strict)
+    n = len(x) - m
+    if n < 2:
+        return 0.0
+    tree = cKDTree(_templates(x, m, n))
+    within = tree.count_neighbors(tree, np.nextafter(r, 0.0), p=np.inf)
+    pairs = (within - n) / 2  # drop self-matches and count each pair once
+    return float(pairs / (n * (n - 1) / 2 + 1e-9))
+
+
+def sample_entropy(rr, m: int = 2, r: Optional[float] = None) -> Optional[float]:
+    """SampEn with tolerance r (default 0.2·SD), counting template pairs with a KD-tree.
+
+    O(N log N) instead of a Python loop over all pairs, so 30-minute RR series stay cheap.
+    """
+    x = np.asarray(rr, dtype=np.float64)
+    if x.size == 0:
+        return None
+    if r is None:
+        r = 0.2 * np.std(x) + 1e-9
+    a = _match_fraction(x, m, r)
+    b = _match_fraction(x, m + 1, r)
+    return float(-np.log((b + 1e-12) / (a + 1e-12)))
+
+
+def approximate_entropy(rr, m: int = 2, r: Optional[float] = None) -> Optional[float]:
+    """ApEn (Pincus): Φm − Φm+1, self-matches included, tolerance r (default 0.2·SD)."""
+    x = np.asarray(rr, dtype=np.float64)
+    if x.size <= m + 1:
+        return None
+    if r is None:
+        r = 0.2 * np.std(x) + 1e-9
+
+    def phi(k):
+        t = _templates(x, k, len(x) - k + 1)
+        counts = cKDTree(t).query_ball_point(t, r, p=np.inf, return_length=True)
+        return float(np.mean(np.log(counts / float(len(t)))))
+
+    return phi(m) - phi(m + 1)
+
+
+def poincare(rr):
+    """Poincaré SD1/SD2 (seconds) of an RR series; both None without successive differences."""
+    x = np.asarray(rr, dtype=np.float64)
+    if x.size == 0:
+        return None, None
+    d = np.diff(x)
+    sd1 = float(np.sqrt(0.5 * np.var(d))) if d.size else None
+    sd2 = float(np.sqrt(2 * np.var(x) - 0.5 * np.var(d))) if d.size else None
+    return sd1, sd2
+
+
+def pnn50(rr) -> Optional[float]:
+    d = np.diff(np.asarray(rr, dtype=np.float64))
+    return float(np.mean(np.abs(d) > 0.05)) if d.size else None
+
+
+def rmssd(rr) -> Optional[float]:
+    d = np.diff(np.asarray(rr, dtype=np.float64))
+    return float(np.sqrt(np.mean(d ** 2))) if d.size else None
+
+
+def hrv_summary(rr) -> dict:
+    x = np.asarray(rr, dtype=np.float64)
+    sd1, sd2 = poincare(x)
+    return {
+        'rrCV': float(np.std(x) / (np.mean(x) + 1e-9)) if x.size else None,
+        'pNN50': pnn50(x),
+        'rmssd': rmssd(x),
+        'sampleEntropy': sample_entropy(x),
+        'approxEntropy': approximate_entropy(x),
+        'poincareSD1': sd1,
+        'poincareSD2': sd2,
+    }
+
+
+def windowed_hrv(beat_times, epoch_sec: float = 60.0, step_sec: float = 30.0) -> List[dict]:
+    """Time-domain HRV over sliding epochs of a beat-time series (seconds).
+
+    Each RR interval belongs to the epoch its closing beat falls in. Epoch
+    statistics come from prefix sums, so the cost is linear in the number of
+    beats plus epochs.
+    """
+    t = np.asarray(beat_times, dtype=np.float64)
+    if t.size < 2 or epoch_sec <= 0 or step_sec <= 0 or t[-1] - t[0] < epoch_sec:
+        return []
+    rr = np.diff(t)
+    ends = t[1:]
+    d = np.diff(rr)
+    big = (np.abs(d) > 0.05).astype(np.float64)
+
+    def prefix(v):
+        return np.concatenate(([0.0], np.cumsum(v)))
+
+    s_rr, s_rr2 = prefix(rr), prefix(rr ** 2)
+    s_d, s_d2, s_big = prefix(d), prefix(d ** 2), prefix(big)
+    starts = np.arange(t[0], t[-1] - epoch_sec + 1e-9, step_sec)
+    lo = np.searchsorted(ends, starts, side='left')
+    hi = np.searchsorted(ends, starts + epoch_sec, side='left')
+    n = hi - lo
+    # successive differences fully inside the epoch: d[k] pairs rr[k], rr[k+1]
+    dlo, dhi = lo, np.maximum(hi - 1, lo)
+    nd = dhi - dlo
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (s_rr[hi] - s_rr[lo]) / n
+        var = np.maximum((s_rr2[hi] - s_rr2[lo]) / n - mean ** 2, 0.0)
+        dmean = (s_d[dhi] - s_d[dlo]) / nd
+        dvar = np.maximum((s_d2[dhi] - s_d2[dlo]) / nd - dmean ** 2, 0.0)
+        rmssd_ = np.sqrt((s_d2[dhi] - s_d2[dlo]) / nd)
+        pnn = (s_big[dhi] - s_big[dlo]) / nd
+    sd2 = np.sqrt(np.maximum(2 * var - 0.5 * dvar, 0.0))
+
+    def val(v, ok):
+        return float(v) if ok else None
+
+    out = []
+    for i in range(starts.size):
+        has_rr, has_d = n[i] > 0, nd[i] > 0
+        out.append({
+            'startSec': float(starts[i] - t[0]),
+            'endSec': float(starts[i] - t[0] + epoch_sec),
+            'beats': int(n[i]),
+            'hrBpm': val(60.0 / mean[i], has_rr),
+            'rrMeanSec': val(mean[i], has_rr),
+            'sdnn': val(np.sqrt(var[i]), has_rr),
+            'rmssd': val(rmssd_[i], has_d),
+            'pNN50': val(pnn[i], has_d),
+            'poincareSD1': val(np.sqrt(0.5 * dvar[i]), has_d),
+            'poincareSD2': val(sd2[i], has_d),
+        })
+    return out
@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+
+
+class StoredSignal(NamedTuple):
+    sr: int
+    y: np.ndarray   # read-only memory map
+    hash: str
+
+
+class SignalStore:
+    """Content-addressed disk store for canonical (mono, 2 kHz float32) media signals.
+
+    objects/<hash>.f32 holds the raw samples and is memory-mapped on read;
+    media/<mediaId>.json maps a media item to its object. Objects are written
+    once (media files are immutable) and evicted least-recently-read first
+    when the store grows past max_bytes.
+    """
+
+    def __init__(self, root: Optional[str], max_bytes: int = 2 << 30):
+        self.root = root or None
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> 'SignalStore':
+        return cls(
+            root=os.getenv('VIZ_SIGNAL_STORE_DIR', os.path.join(tempfile.gettempdir(), 'viz-signals')),
+            max_bytes=int(float(os.getenv('VIZ_SIGNAL_STORE_MB', '2048')) * (1 << 20)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root) and self.max_bytes > 0
+
+    def _object(self, content_hash: str) -> str:
+        return os.path.join(self.root, 'objects', f'{content_hash}.f32')
+
+    def _index(self, media_id: str) -> str:
+        safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in media_id)
+        return os.path.join(self.root, 'media', f'{safe}.json')
+
+    def get(self, media_id: str) -> Optional[StoredSignal]:
+        if not self.enabled or not media_id:
+            return None
+        try:
+            with open(self._index(media_id)) as f:
+                meta = json.load(f)
+            if meta.get('mediaId') != media_id:
+                raise FileNotFoundError(media_id)
+            path = self._object(meta['hash'])
+            y = np.memmap(path, dtype=np.float32, mode='r', shape=(int(meta['n']),))
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # recency for eviction
+        except OSError:
+            pass
+        self.hits += 1
+        return StoredSignal(int(meta['sr']), y, meta['hash'])
+
+    def put(self, media_id: str, sr: int, y: np.ndarray, content_hash: str):
+        if not self.enabled or not media_id or y.nbytes > self.max_bytes:
+            return
+        y = np.ascontiguousarray(y, dtype=np.float32)
+        path = self._object(content_hash)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.makedirs(os.path.dirname(self._index(media_id)), exist_ok=True)
+            if not os.path.exists(path):
+                self._write(path, y.tobytes())
+                self.writes += 1
+            meta = {'mediaId': media_id, 'hash': content_hash, 'sr': int(sr), 'n': int(y.size)}
+            self._write(self._index(media_id), json.dumps(meta).encode('utf-8'))
+            self._evict()
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        # write-then-rename so readers never map a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _evict(self):
+        objects = os.path.join(self.root, 'objects')
+        entries = []
+        for name in os.listdir(objects):
+            if name.endswith('.f32'):
+                try:
+                    st = os.stat(os.path.join(objects, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # index files pointing at a removed object simply miss on the next get()
+            try:
+                os.unlink(os.path.join(objects, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        if not self.root:
+            return
+        with self._lock:
+            for sub in ('objects', 'media'):
+                d = os.path.join(self.root, sub)
+                if os.path.isdir(d):
+                    for name in os.listdir(d):
+                        os.unlink(os.path.join(d, name))
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'maxBytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': (self.hits / lookups) if lookups else None,
+            'writes': self.writes,
+            'evictions': self.evictions,
+        }
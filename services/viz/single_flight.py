@@ -0,0 +1,38 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one in-flight computation.
+
+    Every caller gets the same result object (or exception), so results must
+    be treated as read-only. A caller that goes away does not cancel the
+    shared work for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, Tuple[asyncio.AbstractEventLoop, asyncio.Task]] = {}
+        self.started = 0
+        self.joined = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is loop and not entry[1].done():
+            self.joined += 1
+            return await asyncio.shield(entry[1])
+        task = loop.create_task(fn())
+        self._inflight[key] = (loop, task)
+        self.started += 1
+
+        def _done(t: asyncio.Task):
+            if self._inflight.get(key, (None, None))[1] is t:
+                del self._inflight[key]
+            if not t.cancelled():
+                t.exception()  # consumed here so a result nobody awaited does not warn
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {'inflight': len(self._inflight), 'started': self.started, 'joined': self.joined}
@@ -0,0 +1,87 @@
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from raster import MAGMA_LUT, encode_png
+from stft import frame_count, frame_view, stft_axes
+
+TILE_WIDTH = 256
+_BLOCK_FRAMES = 2048
+
+
+class SpectrogramPyramid(NamedTuple):
+    """STFT magnitudes at hop, 2·hop, 4·hop, ... quantized to uint8 dB.
+
+    levels[l] is (freq_bins, frames) with one column per tile pixel; level 0 is
+    the finest. Every level shares one dB reference (the loudest bin of the
+    recording), so neighbouring tiles and zoom levels use the same colours.
+    """
+    levels: List[np.ndarray]
+    freqs: np.ndarray
+    sr: int
+    hop: int
+    duration: float
+    floor_db: float
+
+    @property
+    def nbytes(self) -> int:
+        return sum(lv.nbytes for lv in self.levels)
+
+    def hop_sec(self, level: int) -> float:
+        return self.hop * (1 << level) / self.sr
+
+
+def _quantize(power: np.ndarray, ref: float, floor_db: float) -> np.ndarray:
+    db = 10.0 * np.log10(power / ref + 1e-12)
+    return np.clip((db - floor_db) * (255.0 / -floor_db), 0, 255).astype(np.uint8)
+
+
+def build_pyramid(y: np.ndarray, sr: int, n_fft: int = 256, hop: int = 32, floor_db: float = -80.0,
+                  tile_width: int = TILE_WIDTH) -> SpectrogramPyramid:
+    """Power spectrogram of y at the finest hop, then pairwise frame averages per level.
+
+    Levels stop once the whole recording fits in one tile.
+    """
+    sr = int(sr)
+    window, freqs = stft_axes(n_fft, hop, sr)
+    frames = frame_view(y, n_fft, hop)
+    num = frame_count(len(y), n_fft, hop)
+    power = np.empty((n_fft // 2 + 1, num), dtype=np.float32)
+    for a in range(0, num, _BLOCK_FRAMES):
+        b = min(num, a + _BLOCK_FRAMES)
+        spec = np.fft.rfft(frames[a:b] * window, axis=1)
+        power[:, a:b] = (spec.real ** 2 + spec.imag ** 2).T
+    ref = float(power.max()) + 1e-20
+    levels = []
+    while True:
+        levels.append(_quantize(power, ref, floor_db))
+        if power.shape[1] <= tile_width:
+            break
+        if power.shape[1] % 2:
+            power = np.concatenate((power, power[:, -1:]), axis=1)
+        power = 0.5 * (power[:, 0::2] + power[:, 1::2])
+    return SpectrogramPyramid(levels, freqs, sr, hop, len(y) / float(sr), floor_db)
+
+
+def render_tile(pyr: SpectrogramPyramid, level: int, x: int, height: int = 256,
+                max_freq: Optional[float] = None, tile_width: int = TILE_WIDTH) -> Optional[bytes]:
+    """PNG of columns [x·tile_width, (x+1)·tile_width) of one level, low frequencies at the bottom.
+
+    Columns past the end of the recording are left at the floor colour;
+    None when the level or tile index does not exist.
+    """
+    if not (0 <= level < len(pyr.levels)) or x < 0:
+        return None
+    lv = pyr.levels[level]
+    start = x * tile_width
+    if start >= lv.shape[1]:
+        return None
+    bins = lv.shape[0]
+    if max_freq and max_freq > 0:
+        bins = max(1, int(np.searchsorted(pyr.freqs, max_freq, side='right')))
+    # nearest bin per pixel row, top row = highest frequency
+    rows = ((np.arange(height)[::-1] + 0.5) * (bins / float(height))).astype(np.int64)
+    block = np.zeros((height, tile_width), dtype=np.uint8)
+    cols = lv[:, start:start + tile_width]
+    block[:, :cols.shape[1]] = cols[np.minimum(rows, bins - 1)]
+    return encode_png(MAGMA_LUT[block])
@@ -0,0 +1,107 @@
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+# Frames per batched rfft call; bounds the complex temporaries on long,
+# full-rate recordings while keeping the Python-level loop tiny.
+_BLOCK_FRAMES = 2048
+
+
+class Stft(NamedTuple):
+    mag: np.ndarray     # (freq_bins, frames) float32
+    power: np.ndarray   # mag ** 2
+    freqs: np.ndarray   # (freq_bins,) Hz
+    times: np.ndarray   # (frames,) frame start in seconds
+    n_fft: int
+    hop: int
+    sr: int
+
+
+@lru_cache(maxsize=32)
+def stft_axes(n_fft: int, hop: int, sr: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Hann window and rfft bin frequencies, shared read-only between requests
+    window = np.hanning(n_fft).astype(np.float32)
+    freqs = np.fft.rfftfreq(n_fft, d=1.0 / sr)
+    window.flags.writeable = False
+    freqs.flags.writeable = False
+    return window, freqs
+
+
+def frame_count(n: int, n_fft: int, hop: int) -> int:
+    return 1 + (n - n_fft) // hop if n >= n_fft else 1
+
+
+def frame_view(y: np.ndarray, n_fft: int, hop: int) -> np.ndarray:
+    # (frames, n_fft) strided view; a signal shorter than n_fft becomes one zero-padded frame
+    y = np.asarray(y, dtype=np.float32)
+    if len(y) < n_fft:
+        pad = np.zeros(n_fft, dtype=np.float32)
+        pad[:len(y)] = y
+        return pad[None, :]
+    return np.lib.stride_tricks.sliding_window_view(y, n_fft)[::hop]
+
+
+def stft(y: np.ndarray, sr: int, n_fft: int = 1024, hop: int = 256) -> Stft:
+    sr = int(sr)
+    window, freqs = stft_axes(n_fft, hop, sr)
+    frames = frame_view(y, n_fft, hop)
+    num = frames.shape[0]
+    mag = np.empty((n_fft // 2 + 1, num), dtype=np.float32)
+    for a in range(0, num, _BLOCK_FRAMES):
+        b = min(num, a + _BLOCK_FRAMES)
+        spec = np.fft.rfft(frames[a:b] * window, axis=1)
+        mag[:, a:b] = np.abs(spec).T
+    times = np.arange(num) * (hop / sr)
+    return Stft(mag=mag, power=mag * mag, freqs=freqs, times=times, n_fft=n_fft, hop=hop, sr=sr)
+
+
+@lru_cache(maxsize=256)
+def _band_mask(win: int, sr: int, lo: float, hi: float, inclusive: bool) -> np.ndarray:
+    freqs = np.fft.rfftfreq(win, 1.0 / sr)
+    mask = (freqs >= lo) & ((freqs <= hi) if inclusive else (freqs < hi))
+    mask.flags.writeable = False
+    return mask
+
+
+class WelchPsd:
+    """Summed |rfft|^2 of Hann-windowed frames, computed once per signal.
+
+    band_power() reads any number of bands from it (masks cached per band),
+    as the mean over frames of the in-band energy.
+    """
+
+    def __init__(self, y: np.ndarray, sr: int, win: int, hop: int, count: int, window: np.ndarray):
+        self.sr = int(sr)
+        self.win = int(win)
+        self.frames = max(0, int(count))
+        self.total = np.zeros(self.win // 2 + 1)
+        if self.frames:
+            view = np.lib.stride_tricks.sliding_window_view(y, self.win)[::hop][:self.frames]
+            for a in range(0, self.frames, _BLOCK_FRAMES):
+                spec = np.fft.rfft(view[a:a + _BLOCK_FRAMES] * window, axis=1)
+                self.total += (np.abs(spec) ** 2).sum(axis=0)
+
+    @classmethod
+    def quality(cls, y: np.ndarray, sr: int) -> 'WelchPsd':
+        # ~4 half-overlapping power-of-two frames; no frames (all bands 0) below 256 samples
+        n = len(y)
+        if n < 256:
+            return cls(y, sr, 128, 64, 0, None)
+        win = 1 << max(7, int(np.floor(np.log2(n))) - 1)
+        hop = max(32, win // 2)
+        window, _ = stft_axes(win, hop, int(sr))
+        return cls(y, sr, win, hop, len(range(0, max(1, n - win), hop)), window)
+
+    @classmethod
+    def whole(cls, y: np.ndarray, sr: int) -> 'WelchPsd':
+        # 1024-sample frames (shorter for short clips), 50% overlap
+        n = len(y)
+        win = 1024 if n >= 2048 else max(128, 1 << max(0, int(np.log2(max(n, 1))) - 1))
+        return cls(y, sr, win, win // 2, len(range(0, n - win, win // 2)), np.hanning(win))
+
+    def band_power(self, lo: float, hi: float, inclusive: bool = False) -> float:
+        if not self.frames:
+            return 0.0
+        mask = _band_mask(self.win, self.sr, float(lo), float(hi), bool(inclusive))
+        return float(self.total[mask].sum()) / (self.frames + 1e-9)
@@ -5,3 +5,87 @@ import sys
 ROOT = os.path.dirname(os.path.dirname(__file__))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
+
+# Run compute jobs on threads in tests; the process pool is covered explicitly
+os.environ.setdefault('VIZ_EXECUTOR', 'thread')
+# Keep the derived-signal disk store out of the shared temp dir
+import tempfile
+os.environ['VIZ_SIGNAL_STORE_DIR'] = tempfile.mkdtemp(prefix='viz-signals-test-')
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches():
+    # Results cached by one test must not short-circuit another
+    import server
+    server.result_cache.clear()
+    server.result_cache.hits = server.result_cache.misses = 0
+    server.signal_cache.clear()
+    server.signal_store.clear()
+    yield
+
+
+def synth_heart_sounds(sr, dur, hr=75.0, first=0.3, noise=0.0, hum=0.0, seed=7):
+    """Synthetic PCG: an S1 burst (50 Hz) every 60/hr s from `first` until `dur - first`,
+    each followed 0.3 s later by a softer S2 (80 Hz), plus optional noise and 7 Hz hum."""
+    t = np.arange(int(sr * dur)) / float(sr)
+    y = noise * np.random.default_rng(seed).standard_normal(len(t)) + hum * np.sin(2 * np.pi * 7 * t)
+    for c in np.arange(first, dur - first, 60.0 / hr):
+        y += np.exp(-((t - c) / 0.02) ** 2) * np.sin(2 * np.pi * 50 * t)
+        y += 0.6 * np.exp(-((t - c - 0.3) / 0.015) ** 2) * np.sin(2 * np.pi * 80 * t)
+    return y.astype(np.float32)
+
+
+@pytest.fixture
+def heart_sounds():
+    return synth_heart_sounds
+
+
+class MediaStandIn:
+    """In-process stand-in for media-service GET /file/{id}, with optional Range support.
+
+    Bodies are streamed in small chunks; `sent` counts body bytes served.
+    """
+
+    def __init__(self, ranges: bool = True, chunk: int = 8192):
+        self.files = {}
+        self.ranges = ranges
+        self.chunk = chunk
+        self.sent = 0
+        self.requests = []
+
+    def _body(self, data):
+        async def gen():
+            for i in range(0, len(data), self.chunk):
+                part = data[i:i + self.chunk]
+                self.sent += len(part)
+                yield part
+        return gen()
+
+    def handler(self, request):
+        import httpx
+        self.requests.append((request.url.path, request.headers.get('range')))
+        data = self.files.get(request.url.path.rsplit('/', 1)[-1])
+        if data is None:
+            return httpx.Response(404, json={'error': 'not found'})
+        rng = request.headers.get('range')
+        if self.ranges and rng and rng.startswith('bytes='):
+            lo, _, hi = rng[6:].partition('-')
+            lo, hi = int(lo), min(int(hi) if hi else len(data) - 1, len(data) - 1)
+            if lo >= len(data):
+                return httpx.Response(416, headers={'Content-Range': f'bytes */{len(data)}'})
+            return httpx.Response(206, headers={'Content-Range': f'bytes {lo}-{hi}/{len(data)}'},
+                                  content=self._body(data[lo:hi + 1]))
+        return httpx.Response(200, content=self._body(data))
+
+
+@pytest.fixture
+def media_server(monkeypatch):
+    import httpx
+    import server
+    from http_pool import SharedHttpClient
+    stand_in = MediaStandIn()
+    monkeypatch.setattr(server, 'http', SharedHttpClient(transport=httpx.MockTransport(stand_in.handler)))
+    return stand_in
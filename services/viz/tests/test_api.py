@@ -1,4 +1,7 @@
+import struct
+
 import numpy as np
+import pytest
 from fastapi.testclient import TestClient
 
 import server as viz_server
@@ -32,6 +35,44 @@ def test_spectrogram_pcm_returns_png():
     assert resp.content.startswith(b'\x89PNG')
 
 
+@pytest.mark.parametrize('size', [(50, 40), (40, 200), (1, 1), (0, 0)])
+def test_spectrogram_pcm_small_sizes_drop_decorations(size):
+    t = np.linspace(0, 0.5, 1000)
+    resp = client.post('/spectrogram_pcm', json={
+        'sampleRate': 2000,
+        'pcm': np.sin(2 * np.pi * 100 * t).tolist(),
+        'width': size[0],
+        'height': size[1]
+    })
+    assert resp.status_code == 200
+    w, h = struct.unpack('>II', resp.content[16:24])
+    assert (w, h) == (max(16, size[0]), max(16, size[1]))
+
+
+def test_spectrogram_pcm_raw_matrix_with_axis_headers():
+    t = np.arange(20000) / 2000.0
+    pcm = np.sin(2 * np.pi * 250 * t) + 0.05 * np.random.default_rng(0).standard_normal(t.size)
+    body = {'sampleRate': 2000, 'pcm': pcm.tolist(), 'width': 1400, 'height': 320, 'maxFreq': 800}
+    png = client.post('/spectrogram_pcm', json=body)
+    raw = client.post('/spectrogram_pcm', json={**body, 'format': 'raw'})
+    assert raw.status_code == 200 and raw.headers['content-type'] == 'application/octet-stream'
+    bins, cols = map(int, raw.headers['X-Spec-Shape'].split(','))
+    m = np.frombuffer(raw.content, dtype=np.uint8).reshape(bins, cols)
+    assert cols == 1 + (20000 - 1024) // 256 and len(raw.content) < len(png.content)
+    step = float(raw.headers['X-Freq-Step'])
+    assert bins == int(800 // step) + 1
+    assert abs(int(np.argmax(m.mean(axis=1))) * step - 250) <= step
+    assert float(raw.headers['X-Time-Step']) == pytest.approx(256 / 2000)
+
+    f16 = client.post('/spectrogram_pcm', json={**body, 'format': 'raw', 'rawDtype': 'float16'})
+    db = np.frombuffer(f16.content, dtype='<f2').reshape(bins, cols).astype(np.float32)
+    lo, hi = float(raw.headers['X-Db-Min']), float(raw.headers['X-Db-Max'])
+    np.testing.assert_allclose(lo + m / 255.0 * (hi - lo), db, atol=(hi - lo) / 255.0 + 0.1)
+    narrow = client.post('/spectrogram_pcm', json={**body, 'format': 'raw', 'width': 10})
+    assert narrow.headers['X-Spec-Shape'] == f"{bins},10"
+    assert client.post('/spectrogram_pcm', json={**body, 'format': 'svg'}).status_code == 400
+
+
 def test_pcg_advanced_includes_timing_headers():
     t = np.linspace(0, 1.0, 2000)
     pcm = np.sin(2 * np.pi * 90 * t).tolist()
@@ -47,6 +88,28 @@ def test_pcg_advanced_includes_timing_headers():
     assert body['events']['s1']
 
 
+def test_pcg_advanced_runs_only_requested_modules(heart_sounds):
+    sr = 2000
+    y = heart_sounds(sr, 6, first=0.2, hum=0.01)
+    full = client.post('/pcg_advanced', json={'sampleRate': sr, 'pcm': y.tolist()}).json()
+    resp = client.post('/pcg_advanced', json={'sampleRate': sr, 'pcm': y.tolist(),
+                                              'modules': ['hr', 'qc', 'rhythm'], 'timings': True})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert set(body) == {'durationSec', 'hrBpm', 'qc', 'extras', 'timings'}
+    assert body['qc'] == full['qc'] and body['extras'] == {'rhythm': full['extras']['rhythm']}
+    stages = resp.headers['Server-Timing']
+    # rhythm pulls in segmentation; murmur and extra sounds never run
+    assert 'segmentation;dur=' in stages and 'total;dur=' in stages and 'murmur' not in stages
+    assert set(body['timings']['stagesMs']) == {'prepare', 'hr', 'segmentation', 'qc', 'rhythm'}
+
+    binary = client.post('/pcg_advanced?modules=hr,qc', content=y.astype('<f4').tobytes(),
+                         headers={'Content-Type': 'application/octet-stream', 'X-Sample-Rate': str(sr)})
+    assert set(binary.json()) == {'durationSec', 'hrBpm', 'qc'}
+    bad = client.post('/pcg_advanced', json={'sampleRate': sr, 'pcm': [0.1] * 10, 'modules': ['nope']})
+    assert bad.status_code == 400
+
+
 def test_waveform_pcm_rejects_empty_segment():
     resp = client.post('/waveform_pcm', json={
         'sampleRate': 2000,
@@ -111,6 +174,24 @@ def test_spectrogram_media_returns_png(monkeypatch):
     assert resp.content.startswith(b'\x89PNG')
 
 
+def test_analyze_core_matches_endpoints_without_json(heart_sounds):
+    import asyncio
+    import json
+
+    sr = 2000
+    y = heart_sounds(sr, 6, first=0.2, hum=0.01)
+    res = viz_server.analyze(y, sr, viz_server.AnalysisOptions(('advanced', 'quality')))
+    assert res.duration_sec == 6.0 and res.features is None and set(res.stage_ms) >= {'hr', 'segmentation'}
+    assert res.advanced == client.post('/pcg_advanced', json={'sampleRate': sr, 'pcm': y.tolist()}).json()
+    assert res.quality == client.post('/pcg_quality_pcm', json={'sampleRate': sr, 'pcm': y.tolist()}).json()
+    # direct calls as in scripts/eval_*: useHsmm without credentials reports the request but does not run HSMM
+    direct = asyncio.run(viz_server.pcg_advanced(sampleRate=sr, pcm=y.tolist(), hash=None, useHsmm=True, authorization=None))
+    same = viz_server.analyze(y, sr, viz_server.AnalysisOptions(hsmm_requested=True)).advanced
+    assert json.loads(direct.body) == same and same['extras']['hsmmRequested'] and not same['extras']['hsmmUsed']
+    with pytest.raises(ValueError):
+        viz_server.analyze(y, sr, viz_server.AnalysisOptions(('spectrogram',)))
+
+
 def test_pcg_advanced_rejects_empty_pcm():
     resp = client.post('/pcg_advanced', json={'sampleRate': 2000, 'pcm': []})
     assert resp.status_code == 400
@@ -126,3 +207,86 @@ def test_pcg_advanced_media_handles_fetch_error(monkeypatch):
     resp = client.post('/pcg_advanced_media', json={'mediaId': 'broken'})
     assert resp.status_code == 400
     assert resp.json()['error'] == 'decode failed'
+
+
+def test_features_pcm_accepts_float32_octet_stream():
+    pcm = np.sin(np.linspace(0, 4 * np.pi, 2048)).astype('<f4')
+    json_resp = client.post('/features_pcm', json={'sampleRate': 2000, 'pcm': pcm.tolist()})
+    bin_resp = client.post(
+        '/features_pcm',
+        content=pcm.tobytes(),
+        headers={'Content-Type': 'application/octet-stream', 'X-Sample-Rate': '2000'},
+    )
+    assert bin_resp.status_code == 200
+    assert bin_resp.json()['spectralCentroid'] == pytest.approx(json_resp.json()['spectralCentroid'], rel=1e-5)
+
+
+def test_spectrogram_pcm_accepts_int16_octet_stream_with_query_params():
+    t = np.linspace(0, 0.5, 1000)
+    pcm = (np.sin(2 * np.pi * 100 * t) * 20000).astype('<i2')
+    resp = client.post(
+        '/spectrogram_pcm?sampleRate=2000&encoding=int16&width=300&height=150',
+        content=pcm.tobytes(),
+        headers={'Content-Type': 'application/octet-stream'},
+    )
+    assert resp.status_code == 200
+    assert resp.content.startswith(b'\x89PNG')
+
+
+def test_octet_stream_requires_sample_rate_and_whole_samples():
+    resp = client.post('/pcg_quality_pcm', content=b'\x00' * 16,
+                       headers={'Content-Type': 'application/octet-stream'})
+    assert resp.status_code == 400
+    assert 'sample rate' in resp.json()['error']
+    resp = client.post('/pcg_quality_pcm', content=b'\x00' * 7,
+                       headers={'Content-Type': 'application/octet-stream', 'X-Sample-Rate': '2000'})
+    assert resp.status_code == 400
+
+
+def test_spectrogram_pcm_annotated_mode_uses_matplotlib():
+    t = np.linspace(0, 0.5, 1000)
+    pcm = np.sin(2 * np.pi * 100 * t).tolist()
+    resp = client.post('/spectrogram_pcm', json={
+        'sampleRate': 2000, 'pcm': pcm, 'width': 400, 'height': 200, 'mode': 'annotated'
+    })
+    assert resp.status_code == 200
+    assert resp.content.startswith(b'\x89PNG')
+    assert 'X-Plot-Time' in resp.headers
+
+
+def test_waveform_pcm_fast_png_matches_requested_size():
+    pcm = np.sin(np.linspace(0, 20 * np.pi, 4000)).tolist()
+    resp = client.post('/waveform_pcm', json={'sampleRate': 2000, 'pcm': pcm, 'width': 320, 'height': 80})
+    assert resp.status_code == 200
+    assert resp.content[16:24] == (320).to_bytes(4, 'big') + (80).to_bytes(4, 'big')
+
+
+def test_pcg_segment_hsmm_returns_json_events(heart_sounds):
+    sr = 2000
+    y = heart_sounds(sr, 6, hr=80, first=0.2)
+    resp = client.post('/pcg_segment_hsmm', json={'sampleRate': sr, 'pcm': y.tolist()})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data['events']['s1'] and all(isinstance(i, int) for i in data['events']['s1'])
+
+
+def test_pcg_segment_hsmm_stream_websocket(heart_sounds):
+    sr = 2000
+    y = heart_sounds(sr, 12, hr=80, first=0.2)
+    pcm = y.astype('<f4')
+    with client.websocket_connect('/pcg_segment_hsmm_stream') as ws:
+        ws.send_json({'sampleRate': sr, 'lagSec': 3})
+        assert ws.receive_json()['frameRate'] == 50.0
+        segments, s1 = [], []
+        for i in range(0, len(pcm), sr):
+            ws.send_bytes(pcm[i:i + sr].tobytes())
+            msg = ws.receive_json()
+            segments += msg['segments']
+            s1 += msg['s1']
+        ws.send_json({'end': True})
+        last = ws.receive_json()
+        assert last['done'] is True
+        segments += last['segments']
+        s1 += last['s1']
+    assert segments[0][1] == 0 and segments[-1][2] == last['finalizedFrames']
+    assert len(s1) >= 10
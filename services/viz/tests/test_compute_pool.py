@@ -0,0 +1,78 @@
+import asyncio
+import math
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server as viz_server
+from compute_pool import ComputePool, ComputeSaturated, ComputeTimeout
+
+
+def test_process_pool_runs_jobs_off_the_event_loop():
+    pool = ComputePool('process', workers=1)
+    try:
+        assert asyncio.run(pool.run(math.factorial, 6)) == 720
+    finally:
+        pool.shutdown()
+
+
+def test_pool_rejects_jobs_beyond_queue_depth():
+    pool = ComputePool('thread', workers=1, queue_depth=0, retry_after=3)
+    gate = threading.Event()
+
+    async def scenario():
+        first = asyncio.ensure_future(pool.run(gate.wait, 5))
+        await asyncio.sleep(0)
+        with pytest.raises(ComputeSaturated) as exc:
+            await pool.run(int, 1)
+        gate.set()
+        assert await first is True
+        return exc.value
+
+    assert asyncio.run(scenario()).retry_after == 3
+    assert pool.inflight == 0
+    pool.shutdown()
+
+
+def test_pool_job_timeout():
+    pool = ComputePool('thread', workers=1, timeout=0.05)
+    with pytest.raises(ComputeTimeout):
+        asyncio.run(pool.run(time.sleep, 0.5))
+    pool.shutdown()
+
+
+def test_saturated_pool_returns_503_with_retry_after(monkeypatch):
+    pool = ComputePool('thread', workers=1, queue_depth=0, retry_after=7)
+    monkeypatch.setattr(pool, '_inflight', pool.capacity)
+    monkeypatch.setattr(viz_server, 'compute_pool', pool)
+    client = TestClient(viz_server.app)
+    resp = client.post('/features_pcm', json={'sampleRate': 2000, 'pcm': np.zeros(256).tolist()})
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '7'
+    resp = client.post('/hard_algo_metrics', json={'sampleRate': 2000, 'pcm': np.zeros(256).tolist()})
+    assert resp.status_code == 503
+
+
+def test_pcg_quality_pcm_runs_on_the_pool(monkeypatch):
+    calls = []
+    real_run = viz_server.compute_pool.run
+
+    async def counting_run(fn, *args):
+        calls.append(fn.__name__)
+        return await real_run(fn, *args)
+
+    monkeypatch.setattr(viz_server.compute_pool, 'run', counting_run)
+    client = TestClient(viz_server.app)
+    pcm = np.sin(np.arange(8000) / 10.0).tolist()
+    resp = client.post('/pcg_quality_pcm', json={'sampleRate': 2000, 'pcm': pcm})
+    assert resp.status_code == 200 and 'isHeart' in resp.json()
+    assert calls == ['_pcg_quality_core']
+
+    pool = ComputePool('thread', workers=1, queue_depth=0, retry_after=4)
+    monkeypatch.setattr(pool, '_inflight', pool.capacity)
+    monkeypatch.setattr(viz_server, 'compute_pool', pool)
+    resp = client.post('/pcg_quality_pcm', json={'sampleRate': 2000, 'pcm': pcm})
+    assert resp.status_code == 503 and resp.headers['Retry-After'] == '4'
@@ -0,0 +1,338 @@
+import os
+import struct
+import subprocess
+import sys
+import zlib
+
+import numpy as np
+import pytest
+from scipy.signal import butter, filtfilt, hilbert, resample_poly
+
+import ai_heart
+import raster
+from ai_heart import _separate_s1_s2, _two_means_labels, analyze_pcg_from_pcm
+from cycles import cycle_index, first_after
+import pcg_hsmm
+from pcg_hsmm import _autocorr_lags, _hsmm_viterbi, hsmm_features, segment_pcg_hsmm
+from pcg_hsmm_stream import StreamResampler, StreamingHsmmSegmenter
+from server import AnalysisOptions, _find_peaks, _murmur_characterization, analyze
+from stft import WelchPsd, stft
+
+
+def test_stft_matches_per_frame_rfft():
+    rng = np.random.default_rng(0)
+    y = rng.standard_normal(5000).astype(np.float32)
+    spec = stft(y, 2000, n_fft=1024, hop=256)
+    window = np.hanning(1024).astype(np.float32)
+    expected = np.stack([np.abs(np.fft.rfft(y[i:i + 1024] * window))
+                         for i in range(0, len(y) - 1024 + 1, 256)], axis=1)
+    assert spec.mag.shape == expected.shape
+    assert np.allclose(spec.mag, expected, rtol=1e-5, atol=1e-4)
+    assert np.allclose(spec.power, expected ** 2, rtol=1e-4, atol=1e-3)
+    assert spec.times[1] == 256 / 2000
+
+
+def test_stft_pads_short_signal_to_one_frame():
+    spec = stft(np.ones(100, dtype=np.float32), 2000)
+    assert spec.mag.shape == (513, 1)
+    assert spec.freqs[-1] == 1000.0
+
+
+def _png_size(data):
+    assert data.startswith(b'\x89PNG\r\n\x1a\n')
+    return struct.unpack('>II', data[16:24])
+
+
+def test_encode_png_roundtrip():
+    img = np.arange(4 * 5 * 3, dtype=np.uint8).reshape(4, 5, 3)
+    png = raster.encode_png(img)
+    assert _png_size(png) == (5, 4)
+    idat = png[png.index(b'IDAT') + 4:png.index(b'IEND') - 8]
+    raw = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(4, 16)
+    assert np.all(raw[:, 0] == 0)
+    assert np.array_equal(raw[:, 1:].reshape(4, 5, 3), img)
+
+
+def test_render_spectrogram_png_uses_requested_size_and_lut():
+    S_db = np.linspace(-60, 0, 513 * 40, dtype=np.float32).reshape(513, 40)
+    assert _png_size(raster.render_spectrogram_png(S_db, [0, 4, 0, 1000], 300, 120)) == (300, 120)
+    bare = raster.render_spectrogram_png(S_db, [0, 4, 0, 1000], 64, 32, axes=False, colorbar=False)
+    assert _png_size(bare) == (64, 32)
+    assert np.array_equal(raster.colorize(np.array([[0.0, 1.0]]))[0], raster.MAGMA_LUT[[0, 255]])
+
+
+def _reference_hsmm_viterbi(E, frame_rate, hr_bpm):
+    # Straightforward explicit-duration Viterbi (the original triple loop)
+    T = E.shape[0]
+    C = frame_rate * 60.0 / max(30.0, min(200.0, hr_bpm))
+    s1_mu = max(2.0, min(8.0, 0.06 * C))
+    s2_mu = max(2.0, min(8.0, 0.05 * C))
+    sys_mu = max(0.15 * C, min(0.45 * C, 0.32 * C))
+    dia_mu = max(0.2 * C, min(0.8 * C, 0.62 * C))
+    mus = [s1_mu, sys_mu, s2_mu, dia_mu]
+    sigs = [max(1.5, 0.25 * s1_mu), 0.25 * sys_mu, max(1.5, 0.25 * s2_mu), 0.25 * dia_mu]
+    mins = [2, max(2, int(0.10 * C)), 2, max(2, int(0.20 * C))]
+    maxs = [8, max(min(T, int(0.6 * C)), mins[1] + 2), 8, max(min(T, int(1.0 * C)), mins[3] + 2)]
+    dur_logp = np.full((4, max(maxs) + 1), -np.inf)
+    for s in range(4):
+        for d in range(mins[s], maxs[s] + 1):
+            dur_logp[s, d] = -0.5 * ((d - mus[s]) / (sigs[s] + 1e-6)) ** 2
+    dp = np.full((T + 1, 4), -np.inf)
+    ptr_state = -np.ones((T + 1, 4), dtype=int)
+    ptr_dur = np.zeros((T + 1, 4), dtype=int)
+    for s in range(4):
+        for d in range(mins[s], min(maxs[s], T) + 1):
+            dp[d, s] = dur_logp[s, d] + E[:d, s].sum()
+            ptr_dur[d, s] = d
+    for t in range(1, T + 1):
+        for s in range(4):
+            ps = (s - 1) % 4
+            for d in range(mins[s], min(maxs[s], t) + 1):
+                score = dp[t - d, ps] + dur_logp[s, d] + E[t - d:t, s].sum()
+                if score > dp[t, s]:
+                    dp[t, s] = score
+                    ptr_dur[t, s] = d
+                    ptr_state[t, s] = ps
+    path = np.zeros(T, dtype=int)
+    t, s = T, int(np.argmax(dp[T]))
+    while t > 0 and s >= 0:
+        d = max(1, int(ptr_dur[t, s]))
+        path[t - d:t] = s
+        ps = int(ptr_state[t, s])
+        if ps < 0:
+            break
+        t -= d
+        s = ps
+    if t > 0:
+        path[:t] = int(np.argmax(E[:t].mean(axis=0)))
+    return path
+
+
+def test_hsmm_viterbi_matches_reference_decoder():
+    rng = np.random.default_rng(3)
+    for T, hr in [(40, 70.0), (180, 120.0), (400, 55.0)]:
+        E = rng.standard_normal((T, 4)).astype(np.float32)
+        assert np.array_equal(_hsmm_viterbi(E, 50.0, hr), _reference_hsmm_viterbi(E.astype(np.float64), 50.0, hr))
+
+
+def test_autocorr_lags_matches_direct_correlation():
+    x = np.random.default_rng(4).random(3000)
+    expected = np.correlate(x, x, mode='full')[len(x) - 1:len(x) - 1 + 500]
+    assert np.allclose(_autocorr_lags(x, 500), expected)
+
+
+def _run_stream(y, sr, chunk, **kw):
+    seg = StreamingHsmmSegmenter(sr, **kw)
+    out = [seg.push(y[i:i + chunk]) for i in range(0, len(y), chunk)] + [seg.flush()]
+    return [s for r in out for s in r['segments']], [i for r in out for i in r['s1']]
+
+
+def test_stream_resampler_matches_resample_poly():
+    x = np.random.default_rng(5).standard_normal(44100 * 2 + 11).astype(np.float32)
+    r = StreamResampler(44100, 2000)
+    parts = [r.push(x[i:i + 3001]) for i in range(0, len(x), 3001)] + [r.flush()]
+    y = np.concatenate(parts)
+    ref = resample_poly(x, 20, 441)
+    assert len(y) == len(ref)
+    assert np.allclose(y, ref, atol=1e-5)
+
+
+def test_streaming_hsmm_is_chunking_invariant_and_matches_offline(heart_sounds):
+    sr = 4000
+    y = heart_sounds(sr, 40, 80, noise=0.02)
+    segs_a, s1_a = _run_stream(y, sr, 1000)
+    segs_b, s1_b = _run_stream(y, sr, 7777)
+    assert segs_a == segs_b and s1_a == s1_b
+    # finalized segments tile the recording in S1 -> Sys -> S2 -> Dia order
+    assert segs_a[0][1] == 0
+    assert all(a[2] == b[1] and b[0] == (a[0] + 1) % 4 for a, b in zip(segs_a, segs_a[1:]))
+    offline = np.array(segment_pcg_hsmm(sr, y)['events']['s1'])
+    hits = [np.min(np.abs(offline - i)) < 100 for i in s1_a]
+    assert len(s1_a) > 40 and np.mean(hits) > 0.9
+
+
+def test_hsmm_feature_bundle_is_built_once_and_reused(monkeypatch, heart_sounds):
+    y = heart_sounds(2000, 20, 70, noise=0.02)
+    feats = hsmm_features(2000, y)
+    assert feats.features.shape == (feats.env_f.size, 4) and 60 < feats.hr_bpm < 80
+    assert segment_pcg_hsmm(2000, y, features=feats) == segment_pcg_hsmm(2000, y)
+
+    calls = []
+    real_env = pcg_hsmm._hilbert_envelope
+
+    def counting_env(*args, **kw):
+        calls.append(1)
+        return real_env(*args, **kw)
+
+    monkeypatch.setattr(pcg_hsmm, '_hilbert_envelope', counting_env)
+    res = analyze(y, 2000, AnalysisOptions(('quality', 'advanced', 'hsmm'), use_hsmm=True))
+    assert res.advanced['extras']['hsmmUsed'] and res.hsmm == segment_pcg_hsmm(2000, y)
+    assert len(calls) == 2  # the analysis shares one bundle; the comparison builds its own
+
+
+def _reference_murmur_cycle(seg, sr):
+    # Per-cycle frame loop the batched murmur characterization replaced
+    hop = max(8, int(0.01*sr)); win = max(16, int(0.02*sr))
+    e = []; cents = []
+    for k in range(0, len(seg)-win, hop):
+        sp = np.abs(np.fft.rfft(seg[k:k+win] * np.hanning(win)))
+        freqs = np.fft.rfftfreq(win, 1.0/sr)
+        m = (freqs >= 150) & (freqs <= 400)
+        pw = (sp[m]**2).sum()
+        e.append(pw)
+        if pw > 0:
+            cents.append((freqs[m]*(sp[m]**2)).sum()/pw)
+    if len(e) < 3:
+        return None
+    e = np.array(e, dtype=np.float32); e = e/(np.max(e)+1e-9)
+    frac = float(np.mean(e > float(np.median(e)+0.3*np.std(e))))
+    if frac <= 0.3:
+        return None
+    slope = float(np.polyfit(np.linspace(0, 1, len(e)), e, 1)[0])
+    return frac, slope, (float(np.median(cents)) if cents else None)
+
+
+def test_murmur_characterization_matches_per_cycle_loop():
+    sr = 2000
+    rng = np.random.default_rng(3)
+    y = (0.05 * rng.standard_normal(sr * 20)).astype(np.float32)
+    s1 = list(range(200, sr * 19, 1600))
+    s2 = [i + 600 + int(rng.integers(-40, 40)) for i in s1]
+    t = np.arange(600) / sr
+    for a in s1[::2]:
+        y[a:a + 600] += (np.linspace(0.2, 1.0, 600) * np.sin(2 * np.pi * 250 * t)).astype(np.float32)
+    res = _murmur_characterization(y, sr, cycle_index(s1, s2), lambda: 0.5)
+
+    sys_ref = [_reference_murmur_cycle(y[a:b], sr) for a, b in zip(s1, s2)]
+    dia_ref = [_reference_murmur_cycle(y[b:a], sr) for b, a in zip(s2, s1[1:])]
+    for side, ref in (('systolic', sys_ref), ('diastolic', dia_ref)):
+        ref = [r for r in ref if r]
+        out = res[side]
+        assert out['present'] == bool(ref)
+        if ref:
+            assert np.isclose(out['coverage'], np.median([r[0] for r in ref]))
+            assert np.isclose(out['pitchHz'], np.median([r[2] for r in ref if r[2] is not None]))
+            assert out['bandRatio'] == 0.5
+    assert res['systolic']['present'] and res['systolic']['shape'] == 'crescendo'
+    empty = _murmur_characterization(y, sr, cycle_index([], []), lambda: 1 / 0)
+    assert not empty['present'] and empty['systolic']['extent'] == 'early'
+
+
+def test_cycle_index_pairs_by_time_not_position():
+    # recording starts mid-cycle (S2 first) and one S2 is missed
+    s1 = [100, 900, 1700, 2500]
+    s2 = [20, 400, 1200, 2800]
+    c = cycle_index(s1, s2)
+    assert c.s1.tolist() == [100, 900, 1700, 2500]
+    assert c.s2.tolist() == [400, 1200, 2800, 2800]
+    assert c.next_s1.tolist() == [900, 1700, -1, -1]
+    assert c.diastole.tolist() == [500, 500, -1, -1] and c.systole.tolist() == [300, 300, 1100, 300]
+    after, found = first_after(np.array([5, 50, 3000]), np.array(s1))
+    assert after[found].tolist() == [100, 100] and found.tolist() == [True, True, False]
+    assert len(cycle_index([], [1, 2])) == 0
+
+
+def _reference_band_power(y, sr, lo, hi, win, hop, starts, window, inclusive):
+    total = 0.0; frames = 0
+    for k in starts:
+        sp = np.fft.rfft(y[k:k + win] * window)
+        freqs = np.fft.rfftfreq(win, 1.0 / sr)
+        mask = (freqs >= lo) & ((freqs <= hi) if inclusive else (freqs < hi))
+        total += float(np.sum(np.abs(sp[mask]) ** 2)); frames += 1
+    return total / (frames + 1e-9)
+
+
+def test_welch_psd_bands_match_per_frame_loops():
+    rng = np.random.default_rng(2)
+    y = rng.standard_normal(9001).astype(np.float32)
+    q = WelchPsd.quality(y, 2000)
+    w = WelchPsd.whole(y, 2000)
+    for lo, hi in ((0, 20), (20, 150), (150, 400), (600, 1000)):
+        ref_q = _reference_band_power(y, 2000, lo, hi, 4096, 2048, range(0, 9001 - 4096, 2048),
+                                      np.hanning(4096).astype(np.float32), False)
+        ref_w = _reference_band_power(y, 2000, lo, hi, 1024, 512, range(0, 9001 - 1024, 512),
+                                      np.hanning(1024), True)
+        assert np.isclose(q.band_power(lo, hi), ref_q, rtol=1e-6)
+        assert np.isclose(w.band_power(lo, hi, inclusive=True), ref_w, rtol=1e-9)
+    assert WelchPsd.quality(y[:200], 2000).band_power(20, 150) == 0.0
+
+
+def test_find_peaks_matches_scanning_loop():
+    def reference(x, distance, threshold):
+        peaks = []; i = distance
+        while i < len(x) - distance:
+            if x[i] == x[i - distance:i + distance + 1].max() and x[i] >= threshold:
+                peaks.append(i); i += distance
+            i += 1
+        return peaks
+    rng = np.random.default_rng(4)
+    x = np.round(rng.random(5000), 2).astype(np.float32)  # plateaus exercise ties
+    for d, thr in ((5, 0.5), (40, 0.9), (400, 0.0)):
+        assert _find_peaks(x, d, thr) == reference(x, d, thr)
+    assert _find_peaks(x[:10], 5, 0.0) == []
+
+
+def test_two_means_split_is_optimal_and_matches_kmeans_partition():
+    rng = np.random.default_rng(5)
+    for trial in range(40):
+        v = np.concatenate([rng.normal(1.0, 0.2, rng.integers(1, 30)), rng.normal(0.5, 0.3, rng.integers(1, 30))])
+        if trial % 4 == 0:
+            v = np.round(v, 1)
+        labels = _two_means_labels(v)
+        # a threshold split: every upper-cluster value exceeds every lower one
+        assert v[labels == 1].min() > v[labels == 0].max(initial=-np.inf)
+
+        def sse(mask):
+            return sum(((v[m] - v[m].mean()) ** 2).sum() for m in (mask, ~mask) if m.any())
+        best = min(sse(v >= t) for t in np.unique(v)[1:]) if np.unique(v).size > 1 else 0.0
+        assert sse(labels == 1) <= best + 1e-9
+    peaks = np.arange(8) * 100
+    amps = np.array([0.9, 0.4, 1.0, 0.35, 0.95, 0.45, 0.85, 0.4])
+    for method in ('exact', 'kmeans'):
+        s1, s2 = _separate_s1_s2(peaks, amps, method)
+        assert s1.tolist() == [0, 200, 400, 600] and s2.tolist() == [100, 300, 500, 700]
+    s1, s2 = _separate_s1_s2(peaks[:3], np.ones(3))
+    assert s1.size == 3 and s2.size == 0
+
+
+def test_server_import_does_not_load_sklearn():
+    code = 'import sys, server; sys.exit(1 if "sklearn" in sys.modules else 0)'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, '-c', code], cwd=root).returncode == 0
+
+
+@pytest.mark.parametrize('n', [40009, 30001])  # prime; pads to an even (40500) and an odd (30375) length
+def test_hard_metrics_fast_path_matches_unpadded_float64_reference(monkeypatch, heart_sounds, n):
+    # the old path ran unpadded float64 FFTs of this length
+    sr = 2000
+    y = heart_sounds(sr, n / sr, 72, noise=0.02)
+    y = y[:n] + 0.05 * np.sin(2 * np.pi * 220 * np.arange(n) / sr).astype(np.float32)
+    out = analyze_pcg_from_pcm(sr, y)
+
+    def reference_filter(signal, fs, lowcut=25.0, highcut=400.0, order=4):
+        b, a = butter(order, [lowcut / (0.5 * fs), highcut / (0.5 * fs)], btype='band')
+        return filtfilt(b, a, np.asarray(signal, dtype=np.float64))
+
+    def reference_envelope(signal, fs, smooth_ms=50, padded=None):
+        power = np.abs(hilbert(signal)) ** 2
+        w = max(int(smooth_ms / 1000 * fs), 1)
+        return np.convolve(power, np.ones(w) / w, mode='same')
+
+    monkeypatch.setattr(ai_heart, '_bandpass_filter', reference_filter)
+    monkeypatch.setattr(ai_heart, '_compute_envelope', reference_envelope)
+    monkeypatch.setattr(ai_heart, '_padded_rfft', lambda x: (np.fft.rfft(np.asarray(x, dtype=np.float64)), len(x)))
+    ref = analyze_pcg_from_pcm(sr, y.astype(np.float64))
+    assert out['num_peaks_detected'] == ref['num_peaks_detected'] > n / sr
+    assert (out['num_s1'], out['num_s2']) == (ref['num_s1'], ref['num_s2'])
+    for key in ('heart_rate_bpm', 's1_s2_amplitude_ratio', 'high_freq_energy_ratio'):
+        assert out[key] == pytest.approx(ref[key], rel=1e-3)
+    assert ai_heart._bandpass_sos(sr, 25.0, 400.0, 4) is ai_heart._bandpass_sos(sr, 25.0, 400.0, 4)
+
+
+@pytest.mark.parametrize('n', [2001, 2048, 30001])
+def test_padded_envelope_matches_hilbert_of_zero_padded_signal(n):
+    x = np.random.default_rng(n).standard_normal(n).astype(np.float32)
+    spec, nfft = ai_heart._padded_rfft(x)
+    assert nfft >= n and spec.size == nfft // 2 + 1
+    ref = np.abs(hilbert(np.pad(x.astype(np.float64), (0, nfft - n)))[:n]) ** 2
+    np.testing.assert_allclose(ai_heart._compute_envelope(x, 2000, smooth_ms=0), ref, atol=1e-5 * ref.max())
@@ -0,0 +1,57 @@
+import asyncio
+import io
+
+import httpx
+import numpy as np
+from fastapi.testclient import TestClient
+from scipy.io import wavfile
+
+import server as viz_server
+from http_pool import SharedHttpClient
+from server import app
+
+
+def test_per_host_cap_holds_until_body_is_read():
+    active = {'now': 0, 'max': 0}
+
+    async def handler(request):
+        active['now'] += 1
+        active['max'] = max(active['max'], active['now'])
+        await asyncio.sleep(0.01)
+        active['now'] -= 1
+        return httpx.Response(200, content=b'ok')
+
+    pool = SharedHttpClient(per_host=2, transport=httpx.MockTransport(handler))
+
+    async def main():
+        client = pool.get()
+        assert pool.get() is client
+        rs = await asyncio.gather(*[client.get('http://media/file/x') for _ in range(6)])
+        await pool.aclose()
+        return rs
+
+    rs = asyncio.run(main())
+    assert [r.content for r in rs] == [b'ok'] * 6
+    assert active['max'] == 2
+
+
+def test_media_endpoints_share_one_client(monkeypatch):
+    bio = io.BytesIO()
+    wavfile.write(bio, 2000, (np.sin(np.arange(4000) / 5.0) * 8000).astype(np.int16))
+    wav = bio.getvalue()
+    seen = []
+
+    def handler(request):
+        seen.append(str(request.url))
+        return httpx.Response(200, content=wav)
+
+    pool = SharedHttpClient(transport=httpx.MockTransport(handler))
+    opened = []
+    real_open = pool._open
+    monkeypatch.setattr(pool, '_open', lambda: opened.append(1) or real_open())
+    monkeypatch.setattr(viz_server, 'http', pool)
+    with TestClient(app) as c:
+        for media_id in ('abc', 'def'):
+            resp = c.post('/features_media', json={'mediaId': media_id})
+            assert resp.status_code == 200
+    assert len(opened) == 1 and len(seen) == 2 and seen[0].endswith('/file/abc')
@@ -0,0 +1,99 @@
+import struct
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server as viz_server
+from peaks import build_peak_pyramid, column_edges, minmax_reduce, peak_columns
+from server import app
+
+client = TestClient(app)
+
+
+def _signal(n=200000, seed=3):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(n) * np.hanning(n) * 0.4).astype(np.float32)
+
+
+def _brute(y, start, end, cols):
+    edges = column_edges(start, end, cols)
+    lo = np.array([y[a:b].min() if b > a else y[a] for a, b in zip(edges[:-1], edges[1:])])
+    hi = np.array([y[a:b].max() if b > a else y[a] for a, b in zip(edges[:-1], edges[1:])])
+    return lo, hi
+
+
+def test_minmax_reduce_matches_per_column_loop():
+    y = _signal(1000)
+    for cols in (1, 7, 999, 1000, 2500):
+        edges = column_edges(0, y.size, cols)
+        lo, hi = minmax_reduce(y, y, edges)
+        ref_lo, ref_hi = _brute(y, 0, y.size, cols)
+        np.testing.assert_array_equal(lo, ref_lo)
+        np.testing.assert_array_equal(hi, ref_hi)
+
+
+def test_pyramid_levels_halve_and_columns_bound_samples():
+    y = _signal()
+    pyr = build_peak_pyramid(y)
+    sizes = [m.size for m in pyr.mins]
+    assert sizes[0] == -(-y.size // 16) and sizes[-1] <= 64
+    assert all(b == (a + 1) // 2 for a, b in zip(sizes, sizes[1:]))
+    q = pyr.scale
+    for start, end, cols in ((0, y.size, 800), (12345, 98765, 300), (5000, 5600, 1200)):
+        lo, hi = peak_columns(pyr, y, start, end, cols)
+        assert lo.size == cols
+        spc = (end - start) / cols
+        level = min(len(sizes) - 1, int(np.log2(spc / 16))) if spc >= 16 else None
+        spp = 1 if level is None else 16 << level
+        edges = column_edges(start, end, cols)
+        for i in range(cols):
+            # a column may include at most one peak width either side of its own samples
+            inner = y[edges[i]:max(edges[i + 1], edges[i] + 1)]
+            outer = y[max(0, edges[i] - spp):edges[i + 1] + spp]
+            assert outer.min() - q <= lo[i] <= inner.min() + q
+            assert inner.max() - q <= hi[i] <= outer.max() + q
+        np.testing.assert_allclose([lo.min(), hi.max()], [y[start:end].min(), y[start:end].max()], atol=q)
+
+@pytest.mark.parametrize('bits', [8, 16])
+def test_waveform_pcm_peaks_formats_share_one_pyramid(monkeypatch, bits):
+    calls = []
+    real_run = viz_server.compute_pool.run
+
+    async def counting_run(fn, *args):
+        calls.append(fn.__name__)
+        return await real_run(fn, *args)
+
+    monkeypatch.setattr(viz_server.compute_pool, 'run', counting_run)
+    y = _signal(60000)
+    body = {'sampleRate': 2000, 'pcm': y.tolist(), 'width': 500}
+    res = client.post('/waveform_pcm', json={**body, 'format': 'json', 'bits': bits})
+    assert res.status_code == 200
+    peaks = res.json()
+    assert peaks['length'] == 500 and peaks['samples_per_pixel'] == 120 and len(peaks['data']) == 1000
+    full = 127 if bits == 8 else 32767
+    data = np.asarray(peaks['data'])
+    assert np.all(data[0::2] <= data[1::2]) and np.abs(data).max() <= full + 1
+
+    dat = client.post('/waveform_pcm', json={**body, 'format': 'binary', 'bits': bits, 'startSec': 10, 'endSec': 20})
+    version, flags, rate, spp, length = struct.unpack('<iIiiI', dat.content[:20])
+    assert (version, flags, rate, spp, length) == (1, 1 if bits == 8 else 0, 2000, 40, 500)
+    assert len(dat.content) == 20 + 2 * length * bits // 8
+
+    png = client.post('/waveform_pcm', json={**body, 'height': 100})
+    assert png.headers['content-type'] == 'image/png' and png.headers['X-Signal-Hash'] == res.headers['X-Signal-Hash']
+    assert calls.count('build_peak_pyramid') == 1
+    assert client.post('/waveform_pcm', json={**body, 'format': 'svg'}).status_code == 400
+
+
+def test_waveform_pcm_peaks_scale_loud_signals_and_zoom_past_one_sample():
+    y = _signal(20000) * 8.0
+    body = {'sampleRate': 2000, 'pcm': y.tolist(), 'format': 'json', 'bits': 8}
+    data = np.asarray(client.post('/waveform_pcm', json={**body, 'width': 400}).json()['data'])
+    # divided by the recording peak rather than clipped: only the loudest columns reach full scale
+    assert np.abs(data).max() in (127, 128) and np.mean(np.abs(data) >= 127) < 0.05
+
+    zoomed = client.post('/waveform_pcm', json={**body, 'width': 500, 'startSec': 5.0, 'endSec': 5.1}).json()
+    assert zoomed['samples_per_pixel'] == 1 and zoomed['length'] == 500
+    dat = client.post('/waveform_pcm', json={**body, 'format': 'binary', 'width': 500, 'startSec': 5.0, 'endSec': 5.1})
+    assert struct.unpack('<iIiiI', dat.content[:20])[3] == 1
@@ -0,0 +1,61 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server as viz_server
+from result_cache import ResultCache
+from server import app
+
+client = TestClient(app)
+
+
+def test_result_cache_lru_eviction_by_bytes():
+    cache = ResultCache(max_bytes=10, ttl=None)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    assert cache.get('a') == b'12345'  # 'a' becomes most recent
+    cache.put('c', b'123')
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    stats = cache.stats()
+    assert stats['bytes'] == 8 and stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1
+
+
+def test_result_cache_ttl_expiry(monkeypatch):
+    cache = ResultCache(max_bytes=1000, ttl=10)
+    now = [100.0]
+    monkeypatch.setattr('result_cache.time.monotonic', lambda: now[0])
+    cache.put('k', {'x': 1})
+    assert cache.get('k') == {'x': 1}
+    now[0] += 11
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_spectrogram_and_advanced_served_from_local_cache(monkeypatch, heart_sounds):
+    calls = []
+    real_run = viz_server.compute_pool.run
+
+    async def counting_run(fn, *args):
+        calls.append(fn.__name__)
+        return await real_run(fn, *args)
+
+    monkeypatch.setattr(viz_server.compute_pool, 'run', counting_run)
+    y = heart_sounds(2000, 6, first=0.2, hum=0.01)
+    pcm = y.tolist()
+    spec = {'sampleRate': 2000, 'pcm': pcm, 'width': 300, 'height': 120}
+    first = client.post('/spectrogram_pcm', json=spec)
+    second = client.post('/spectrogram_pcm', json=spec)
+    assert first.status_code == second.status_code == 200
+    assert 'X-Cache' not in first.headers and second.headers['X-Cache-Tier'] == 'local'
+    assert first.content == second.content
+    # different render parameters are a different entry
+    assert 'X-Cache' not in client.post('/spectrogram_pcm', json={**spec, 'width': 320}).headers
+
+    adv = {'sampleRate': 2000, 'pcm': pcm}
+    a1 = client.post('/pcg_advanced', json=adv)
+    a2 = client.post('/pcg_advanced', json=adv)
+    assert a1.json() == a2.json() and a2.headers['X-Cache'] == 'HIT'
+    assert calls.count('_spectrogram_job') == 2 and calls.count('_advanced_job') == 1
+    stats = client.get('/cache_stats').json()['results']
+    assert stats['hits'] == 2 and stats['entries'] == 3
@@ -0,0 +1,69 @@
+import numpy as np
+
+from rhythm import approximate_entropy, hrv_summary, sample_entropy, windowed_hrv
+
+
+def _reference_sampen(rr):
+    # Pairwise loop sample entropy formerly inlined in pcg_advanced
+    r = 0.2 * np.std(rr) + 1e-9
+
+    def phi(m):
+        N = len(rr)
+        if N <= m + 1:
+            return 0.0
+        count = 0; total = 0
+        for i in range(N - m):
+            for j in range(i + 1, N - m):
+                if np.max(np.abs(rr[i:i + m] - rr[j:j + m])) < r:
+                    count += 1
+            total += (N - m - 1 - i)
+        return count / (total + 1e-9)
+    return float(-np.log((phi(3) + 1e-12) / (phi(2) + 1e-12)))
+
+
+def _reference_apen(x, m=2):
+    r = 0.2 * np.std(x) + 1e-9
+
+    def phi(k):
+        t = np.array([x[i:i + k] for i in range(len(x) - k + 1)])
+        c = [np.mean(np.max(np.abs(t - row), axis=1) <= r) for row in t]
+        return np.mean(np.log(c))
+    return phi(m) - phi(m + 1)
+
+
+def test_entropies_match_pairwise_definitions():
+    rng = np.random.default_rng(5)
+    # quantized like sample-index RR intervals, so exact ties occur
+    rr = np.round(0.8 + 0.05 * rng.standard_normal(150), 3)
+    assert np.isclose(sample_entropy(rr), _reference_sampen(rr))
+    assert np.isclose(approximate_entropy(rr), _reference_apen(rr))
+    assert sample_entropy([0.8]) == 0.0 and sample_entropy([]) is None
+
+
+def test_hrv_summary_time_domain_metrics():
+    rr = np.array([0.8, 0.9, 0.88, 0.86, 0.8])
+    h = hrv_summary(rr)
+    d = np.diff(rr)
+    assert np.isclose(h['rmssd'], np.sqrt(np.mean(d ** 2)))
+    assert h['pNN50'] == 0.5
+    assert np.isclose(h['poincareSD1'], np.sqrt(0.5 * np.var(d)))
+    single = hrv_summary([0.8])
+    assert single['pNN50'] is None and single['poincareSD1'] is None
+
+
+def test_windowed_hrv_matches_direct_epoch_statistics():
+    rng = np.random.default_rng(1)
+    beats = np.cumsum(0.8 + 0.05 * rng.standard_normal(2400))  # ~32 minutes
+    epochs = windowed_hrv(beats, epoch_sec=60.0, step_sec=30.0)
+    assert len(epochs) == int((beats[-1] - beats[0] - 60.0) // 30.0) + 1
+    e = epochs[7]
+    t0 = beats[0] + e['startSec']
+    ends = beats[1:]
+    rr = np.diff(beats)[(ends >= t0) & (ends < t0 + 60.0)]
+    d = np.diff(rr)
+    assert e['beats'] == rr.size
+    assert np.isclose(e['rrMeanSec'], rr.mean()) and np.isclose(e['sdnn'], rr.std())
+    assert np.isclose(e['rmssd'], np.sqrt(np.mean(d ** 2)))
+    assert np.isclose(e['pNN50'], np.mean(np.abs(d) > 0.05))
+    assert np.isclose(e['poincareSD2'], np.sqrt(2 * np.var(rr) - 0.5 * np.var(d)))
+    assert windowed_hrv(beats[:10]) == []
@@ -0,0 +1,57 @@
+import io
+import os
+
+import numpy as np
+from fastapi.testclient import TestClient
+from scipy.io import wavfile
+
+import server as viz_server
+from signal_store import SignalStore
+
+
+def _wav(sr, sec):
+    bio = io.BytesIO()
+    x = np.random.default_rng(0).standard_normal(sr * sec) * 3000
+    wavfile.write(bio, sr, x.astype(np.int16))
+    return bio.getvalue()
+
+
+def test_store_round_trip_and_eviction(tmp_path):
+    store = SignalStore(str(tmp_path), max_bytes=3 * 4000)
+    y = np.arange(1000, dtype=np.float32)
+    store.put('a/b', 2000, y, 'h1')
+    got = store.get('a/b')
+    assert got.sr == 2000 and got.hash == 'h1' and isinstance(got.y, np.memmap)
+    np.testing.assert_array_equal(got.y, y)
+    assert not got.y.flags.writeable
+    assert store.get('a_b') is None  # sanitized names do not collide
+
+    for i, key in enumerate(('m2', 'm3', 'm4')):
+        store.put(key, 2000, y + i, f'h{i + 2}')
+        os.utime(store._object(f'h{i + 2}'), (i + 10, i + 10))
+    os.utime(store._object('h1'), (1, 1))
+    store.put('m5', 2000, y, 'h5')
+    assert store.get('a/b') is None and store.get('m5') is not None
+    assert store.evictions == 2
+
+
+def test_media_signal_is_mapped_from_store(media_server):
+    client = TestClient(viz_server.app)
+    media_server.files['m1'] = _wav(44100, 3)
+    first = client.post('/features_media', json={'mediaId': 'm1'}, headers={'Authorization': 'Bearer a'})
+    assert first.status_code == 200
+    assert [p for p, _ in media_server.requests] == ['/file/m1']
+
+    # a fresh worker: nothing in memory, the canonical signal comes off disk
+    viz_server.signal_cache.clear()
+    viz_server.result_cache.clear()
+    again = client.post('/features_media', json={'mediaId': 'm1'}, headers={'Authorization': 'Bearer a'})
+    assert again.json() == first.json()
+    # only the access check goes to media-service, never the file
+    assert [p for p, _ in media_server.requests] == ['/file/m1', '/file_url/m1']
+    sig = viz_server.signal_cache.get('media:m1')
+    assert sig.sr == 2000 and isinstance(sig.y, np.memmap)
+
+    window = client.post('/pcg_quality_media', json={'mediaId': 'm1', 'startSec': 1.0, 'endSec': 2.0},
+                         headers={'Authorization': 'Bearer a'})
+    assert window.status_code == 200 and len(media_server.requests) == 2
@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import io
+
+import httpx
+import numpy as np
+from scipy.io import wavfile
+
+import server as viz_server
+from http_pool import SharedHttpClient
+from server import app
+from single_flight import SingleFlight
+
+
+def test_single_flight_shares_result_and_errors():
+    flights = SingleFlight()
+    runs = []
+
+    async def work(v):
+        runs.append(v)
+        await asyncio.sleep(0.01)
+        if v == 'bad':
+            raise ValueError('boom')
+        return {'v': v}
+
+    async def main():
+        a = await asyncio.gather(*[flights.do('k', lambda: work('ok')) for _ in range(4)])
+        b = await asyncio.gather(*[flights.do('e', lambda: work('bad')) for _ in range(3)], return_exceptions=True)
+        return a, b
+
+    a, b = asyncio.run(main())
+    assert runs == ['ok', 'bad']
+    assert all(r is a[0] for r in a)
+    assert all(isinstance(e, ValueError) for e in b)
+    assert flights.stats() == {'inflight': 0, 'started': 2, 'joined': 5}
+
+
+def _media_stub(monkeypatch, public=True, sr=2000, y=None):
+    if y is None:
+        t = np.arange(sr * 4) / float(sr)
+        y = np.sin(2 * np.pi * 40 * t)
+    bio = io.BytesIO()
+    wavfile.write(bio, sr, (y * 8000).astype(np.int16))
+    wav = bio.getvalue()
+    calls = []
+
+    async def handler(request):
+        calls.append((request.url.path, request.headers.get('authorization')))
+        await asyncio.sleep(0.02)
+        if request.url.path.startswith('/file_url/'):
+            ok = public or request.headers.get('authorization') == 'Bearer owner'
+            return httpx.Response(200 if ok else 403, json={'url': 'x'})
+        return httpx.Response(200, content=wav)
+
+    monkeypatch.setattr(viz_server, 'http', SharedHttpClient(transport=httpx.MockTransport(handler)))
+    return calls
+
+
+async def _post_all(requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://viz') as c:
+        return await asyncio.gather(*[c.post(path, json=body, headers=headers) for path, body, headers in requests])
+
+
+def test_media_endpoints_fetch_and_decode_once(monkeypatch):
+    calls = _media_stub(monkeypatch)
+    owner = {'Authorization': 'Bearer owner'}
+    res = asyncio.run(_post_all([
+        ('/features_media', {'mediaId': 'm1'}, owner),
+        ('/pcg_quality_media', {'mediaId': 'm1'}, owner),
+        ('/spectrogram_media', {'mediaId': 'm1', 'width': 200, 'height': 100}, owner),
+        ('/features_media', {'mediaId': 'm1'}, owner),
+    ]))
+    assert [r.status_code for r in res] == [200, 200, 200, 200]
+    assert res[0].json() == res[3].json()
+    assert calls == [('/file/m1', 'Bearer owner')]
+    # another user reuses the decoded signal after a cheap access check
+    res = asyncio.run(_post_all([('/features_media', {'mediaId': 'm1'}, {'Authorization': 'Bearer other'})]))
+    assert res[0].status_code == 200
+    assert calls[1:] == [('/file_url/m1', 'Bearer other')]
+
+
+def test_cached_signal_still_enforces_media_access(monkeypatch):
+    calls = _media_stub(monkeypatch, public=False)
+    asyncio.run(_post_all([('/features_media', {'mediaId': 'm2'}, {'Authorization': 'Bearer owner'})]))
+    res = asyncio.run(_post_all([('/features_media', {'mediaId': 'm2'}, {'Authorization': 'Bearer other'})]))
+    assert res[0].status_code == 400 and '403' in res[0].json()['error']
+    assert [c[0] for c in calls] == ['/file/m2', '/file_url/m2']
+
+
+def test_analyze_media_shares_one_decode_and_matches_single_endpoints(monkeypatch, heart_sounds):
+    sr = 4000
+    y = heart_sounds(sr, 6, first=0.2, hum=0.01)
+    calls = _media_stub(monkeypatch, sr=sr, y=y / np.max(np.abs(y)))
+    jobs = []
+    real_run = viz_server.compute_pool.run
+
+    async def counting_run(fn, *args):
+        jobs.append(fn.__name__)
+        return await real_run(fn, *args)
+
+    monkeypatch.setattr(viz_server.compute_pool, 'run', counting_run)
+    owner = {'Authorization': 'Bearer owner'}
+    spec = {'width': 200, 'height': 100}
+    body = {'mediaId': 'm1', 'sections': ['features', 'quality', 'advanced', 'spectrogram'], **spec}
+    (res,) = asyncio.run(_post_all([('/analyze_media', body, owner)]))
+    assert res.status_code == 200 and res.headers['X-Cache'] == 'MISS'
+    data = res.json()
+    assert jobs == ['_analyze_job'] and calls == [('/file/m1', 'Bearer owner')]
+
+    single = asyncio.run(_post_all([
+        ('/features_media', {'mediaId': 'm1'}, owner),
+        ('/pcg_quality_media', {'mediaId': 'm1'}, owner),
+        ('/pcg_advanced_media', {'mediaId': 'm1'}, owner),
+        ('/spectrogram_media', {'mediaId': 'm1', **spec}, owner),
+    ]))
+    assert data['features'] == single[0].json()
+    assert data['quality'] == single[1].json()
+    assert data['advanced'] == single[2].json() and single[2].headers['X-Cache-Tier'] == 'local'
+    assert single[3].headers['X-Cache-Tier'] == 'local'
+    png = asyncio.run(_get(data['spectrogram']['url']))
+    assert png.headers['content-type'] == 'image/png' and png.content == single[3].content
+
+    (again,) = asyncio.run(_post_all([('/analyze_media', {**body, 'spectrogramFormat': 'base64'}, owner)]))
+    assert again.headers['X-Cache'] == 'HIT'
+    assert base64.b64decode(again.json()['spectrogram']['png']) == png.content
+    assert jobs.count('_analyze_job') == 1 and len(calls) == 1
+
+
+async def _get(path):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://viz') as c:
+        return await c.get(path)
@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server as viz_server
+from server import app
+from spectrogram_tiles import TILE_WIDTH, build_pyramid, render_tile
+
+client = TestClient(app)
+
+
+def _tone(sec=30, sr=2000, freq=150.0):
+    t = np.arange(int(sec * sr)) / float(sr)
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def test_pyramid_levels_halve_until_one_tile():
+    pyr = build_pyramid(_tone(), 2000)
+    widths = [lv.shape[1] for lv in pyr.levels]
+    assert widths[0] == 1 + (60000 - 256) // 32
+    assert all(b == (a + 1) // 2 for a, b in zip(widths, widths[1:]))
+    assert widths[-1] <= TILE_WIDTH < widths[-2]
+    assert all(lv.dtype == np.uint8 for lv in pyr.levels)
+    # the tone's bin is the loudest row at every level
+    tone_bin = int(round(150.0 / (2000 / 256)))
+    assert all(int(np.argmax(lv.mean(axis=1))) == tone_bin for lv in pyr.levels)
+
+
+def test_render_tile_fixed_size_and_bounds():
+    pyr = build_pyramid(_tone(sec=5), 2000)
+    png = render_tile(pyr, 0, 1, height=128, max_freq=500)
+    img = np.asarray(Image.open(io.BytesIO(png)))
+    assert img.shape == (128, TILE_WIDTH, 3)
+    # 150 Hz sits 30% of the way up a 0..500 Hz tile
+    row = int(np.argmax(img[:, 10].astype(int).sum(axis=1)))
+    assert abs((127 - row) / 127.0 - 0.3) < 0.03
+    assert render_tile(pyr, 0, 99) is None and render_tile(pyr, len(pyr.levels), 0) is None
+
+
+def test_spectrogram_tile_endpoint_builds_pyramid_once(monkeypatch):
+    calls = []
+    real_run = viz_server.compute_pool.run
+
+    async def counting_run(fn, *args):
+        calls.append(fn.__name__)
+        return await real_run(fn, *args)
+
+    monkeypatch.setattr(viz_server.compute_pool, 'run', counting_run)
+    y = _tone(sec=20)
+    spec = client.post('/spectrogram_pcm', json={'sampleRate': 2000, 'pcm': y.tolist(), 'width': 200, 'height': 100})
+    content_hash = spec.headers['X-Signal-Hash']
+    first = client.get('/spectrogram_tile', params={'hash': content_hash, 'level': 0, 'x': 2})
+    assert first.status_code == 200 and first.headers['X-Cache'] == 'MISS'
+    assert float(first.headers['X-Tile-Start-Sec']) == 2 * TILE_WIDTH * 32 / 2000
+    other = client.get('/spectrogram_tile', params={'hash': content_hash, 'level': 1, 'x': 0})
+    again = client.get('/spectrogram_tile', params={'hash': content_hash, 'level': 0, 'x': 2})
+    assert other.status_code == 200 and again.headers['X-Cache'] == 'HIT' and again.content == first.content
+    assert calls.count('build_pyramid') == 1
+    assert client.get('/spectrogram_tile', params={'hash': content_hash, 'level': 0, 'x': 500}).status_code == 404
+    assert client.get('/spectrogram_tile', params={'hash': 'f' * 64}).status_code == 404
+
+
+def test_tiles_of_full_rate_upload_use_the_2k_signal():
+    y = _tone(sec=20, sr=44100)
+    spec = client.post('/spectrogram_pcm', json={'sampleRate': 44100, 'pcm': y.tolist(), 'width': 200, 'height': 100})
+    content_hash = spec.headers['X-Signal-Hash']
+    tile = client.get('/spectrogram_tile', params={'hash': content_hash, 'level': 0, 'x': 0, 'height': 128, 'maxFreq': 500})
+    assert tile.status_code == 200 and abs(float(tile.headers['X-Duration-Sec']) - 20.0) < 0.01
+    pyr = viz_server.result_cache.get(f"pyramid:{content_hash}")
+    assert pyr.sr == 2005 and pyr.freqs[-1] < 1003
+    assert pyr.levels[0].shape[1] == 1 + (-(-len(y) // 22) - 256) // 32
+    # the tone sits 30% of the way up a 0..500 Hz tile, as for a 2 kHz upload
+    img = np.asarray(Image.open(io.BytesIO(tile.content)))
+    row = int(np.argmax(img[:, 10].astype(int).sum(axis=1)))
+    assert abs((127 - row) / 127.0 - 0.3) < 0.03
@@ -0,0 +1,159 @@
+import asyncio
+import io
+import math
+import struct
+
+import httpx
+import numpy as np
+import pytest
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+
+import server as viz_server
+from http_pool import SharedHttpClient
+from server import _decimate_to_2k
+from wav_stream import WavFormatError, WavStreamDecoder
+
+
+def _wav(sr, x):
+    bio = io.BytesIO()
+    wavfile.write(bio, sr, x)
+    return bio.getvalue()
+
+
+def _reference(data):
+    # whole-file path: wavfile.read, scale, downmix, _decimate_to_2k, then exactly 2 kHz
+    sr, x = wavfile.read(io.BytesIO(data))
+    y = x.astype(np.float32)
+    if x.dtype.kind in ('i', 'u'):
+        y /= float(np.iinfo(x.dtype).max)
+    if y.ndim > 1:
+        y = y.mean(axis=1, dtype=np.float32)
+    y2, sr2 = _decimate_to_2k(y, sr)
+    if sr > 2000 and sr2 != 2000:
+        g = math.gcd(2000, sr2)
+        y2, sr2 = resample_poly(y2, 2000 // g, sr2 // g).astype(np.float32), 2000
+    return y2, sr2
+
+
+def _decode(data, chunk):
+    dec = WavStreamDecoder(target_sr=2000)
+    for i in range(0, len(data), chunk):
+        dec.feed(data[i:i + chunk])
+    return dec.finish()
+
+
+@pytest.mark.parametrize('sr,dtype,channels', [
+    (48000, np.int32, 1), (48000, np.int16, 2), (44100, np.float32, 1), (4000, np.int16, 1), (2000, np.int16, 1),
+])
+def test_stream_decode_matches_whole_file_decode(sr, dtype, channels):
+    rng = np.random.default_rng(sr)
+    x = rng.standard_normal((sr * 2 + 7, channels)).squeeze() * 0.2
+    if np.dtype(dtype).kind == 'i':
+        x = (x * np.iinfo(dtype).max).astype(dtype)
+    data = _wav(sr, x.astype(dtype))
+    y_ref, sr_ref = _reference(data)
+    for chunk in (1, 333, 65536):
+        sr_out, y = _decode(data, chunk)
+        assert sr_out == sr_ref and y.dtype == np.float32
+        np.testing.assert_allclose(y, y_ref, atol=1e-6)
+
+
+def test_stream_decode_24bit_and_truncated_data():
+    v = np.array([0, 1, -1, 8388607, -8388608, 1234567], dtype=np.int32)
+    raw = b''.join(struct.pack('<i', int(s))[:3] for s in v)
+    fmt = struct.pack('<HHIIHH', 1, 1, 2000, 6000, 3, 24)
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(raw) + 30) + raw
+    sr, y = _decode(b'RIFF' + struct.pack('<I', len(body)) + body, 4)
+    assert sr == 2000 and y.size == v.size  # header promised more than arrived
+    np.testing.assert_allclose(y, (v << 8) / 2147483647.0, rtol=1e-6)
+
+
+def test_stream_decode_rejects_non_wav():
+    dec = WavStreamDecoder()
+    with pytest.raises(WavFormatError):
+        dec.feed(b'OggS' + b'\0' * 64)
+
+
+def test_fetch_streams_and_decimates(monkeypatch):
+    sr = 48000
+    t = np.arange(sr * 3) / float(sr)
+    data = _wav(sr, (np.sin(2 * np.pi * 40 * t)[:, None] * [8000, 4000]).astype(np.int16))
+
+    async def body():
+        for i in range(0, len(data), 4096):
+            yield data[i:i + 4096]
+
+    def handler(request):
+        if request.url.path.endswith('/bad'):
+            return httpx.Response(200, content=b'not a wav file')
+        return httpx.Response(200, content=body())
+
+    monkeypatch.setattr(viz_server, 'http', SharedHttpClient(transport=httpx.MockTransport(handler)))
+    sr_out, y, err = asyncio.run(viz_server._fetch_wav_and_decode('m1', None))
+    y_ref, _ = _reference(data)
+    assert err is None and sr_out == 2000
+    np.testing.assert_allclose(y, y_ref, atol=1e-6)
+    _, _, err = asyncio.run(viz_server._fetch_wav_and_decode('bad', None))
+    assert err.startswith('unsupported format')
+
+
+def _recording(sr=48000, sec=20, channels=2):
+    rng = np.random.default_rng(1)
+    x = rng.standard_normal((sr * sec, channels)) * 3000
+    return _wav(sr, x.astype(np.int16))
+
+
+@pytest.mark.parametrize('ranges,sr', [(True, 48000), (False, 48000), (True, 44100)])
+def test_window_fetch_matches_slice_of_whole_decode(media_server, ranges, sr):
+    media_server.ranges = ranges
+    media_server.files['m1'] = data = _recording(sr=sr)
+    y_all, sr = _reference(data)
+    for start, end in ((7.3, 12.0), (0.0, 0.5), (None, 1.0), (19.5, 30.0), (3.0, None)):
+        media_server.sent = 0
+        sr_out, y, err = asyncio.run(viz_server._fetch_wav_window('m1', None, start, end))
+        assert err is None and sr_out == sr
+        np.testing.assert_allclose(y, viz_server._slice_by_time(y_all, sr, start, end), atol=1e-6)
+        if ranges and end is not None and start is not None and end - start <= 5:
+            assert media_server.sent < len(data) * (end - start + 1) / 20
+        if not ranges and end is not None and end <= 1:
+            assert media_server.sent < len(data) / 4  # a 200 body is only read up to the window
+    _, _, err = asyncio.run(viz_server._fetch_wav_window('m1', None, 25.0, 30.0))
+    assert err == 'empty segment'
+
+
+def test_media_endpoints_accept_time_window(media_server):
+    from fastapi.testclient import TestClient
+    client = TestClient(viz_server.app)
+    media_server.files['m1'] = data = _recording(sec=10)
+    y_all, sr = _reference(data)
+    resp = client.post('/features_media', json={'mediaId': 'm1', 'startSec': 2.0, 'endSec': 4.0})
+    assert resp.status_code == 200
+    part = viz_server._slice_by_time(y_all, sr, 2.0, 4.0)
+    expected = client.post('/features_pcm', json={'sampleRate': sr, 'pcm': part.tolist()}).json()
+    assert resp.json() == pytest.approx(expected, rel=1e-4)
+    assert media_server.sent < len(data) / 4
+    assert all(r[1] is not None for r in media_server.requests)
+
+    # once the whole recording is cached, windows are sliced from it without fetching
+    assert client.post('/features_media', json={'mediaId': 'm1'}).status_code == 200
+    n = len(media_server.requests)
+    spec = client.post('/spectrogram_media', json={'mediaId': 'm1', 'startSec': 1.0, 'endSec': 3.0})
+    assert spec.status_code == 200 and spec.headers['content-type'] == 'image/png'
+    assert len(media_server.requests) == n
+    assert client.post('/pcg_quality_media', json={'mediaId': 'm1', 'startSec': 11.0}).status_code == 400
+
+
+@pytest.mark.parametrize('ranges', [True, False])
+def test_window_fetch_falls_back_after_releasing_the_probe(media_server, monkeypatch, ranges):
+    import httpx
+    media_server.ranges = ranges
+    data = bytearray(_recording(sec=4))
+    data[data.index(b'data') + 4:data.index(b'data') + 8] = struct.pack('<I', 0xFFFFFFFF)  # streamed: no data size
+    media_server.files['m1'] = bytes(data)
+    # one connection per host: the full fetch can only start once the probe is closed
+    monkeypatch.setattr(viz_server, 'http', SharedHttpClient(transport=httpx.MockTransport(media_server.handler), per_host=1))
+    sr, y, err = asyncio.run(asyncio.wait_for(viz_server._fetch_wav_window('m1', None, 1.0, 2.0), 5))
+    y_all, _ = _reference(_recording(sec=4))
+    assert err is None and sr == 2000
+    np.testing.assert_allclose(y, viz_server._slice_by_time(y_all, sr, 1.0, 2.0), atol=1e-6)
@@ -0,0 +1,296 @@
+import math
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.signal import resample_poly
+
+_PCM = 1
+_FLOAT = 3
+_EXTENSIBLE = 0xFFFE
+_UNKNOWN_SIZE = (0, 0xFFFFFFFF)
+
+
+class WavFormatError(ValueError):
+    pass
+
+
+def decimation_factor(sr: int, target_sr: Optional[int]) -> int:
+    if not target_sr or sr <= target_sr:
+        return 1
+    return max(1, int(round(sr / target_sr)))
+
+
+class WavStreamDecoder:
+    """Incremental RIFF/WAVE decoder: feed() raw bytes as they arrive, finish() for (sr, y).
+
+    Output is mono float32 (channels averaged), scaled like the old
+    wavfile-based path (integers divided by their dtype max). With a
+    target_sr the signal is box-averaged over k = round(sr / target_sr)
+    samples and strided by k on the fly — the same result as
+    server._decimate_to_2k — so only the output buffer is ever held. When
+    that lands near but not on target_sr (44.1 kHz gives 2005 Hz), finish()
+    polyphase-resamples the decimated signal once so the output is exactly
+    target_sr.
+    """
+
+    def __init__(self, target_sr: Optional[int] = None):
+        self.target_sr = target_sr
+        self._head = bytearray()
+        self._fmt: Optional[Tuple[int, int, int, int, int]] = None
+        self._in_data = False
+        self._remaining: Optional[int] = None  # data bytes left; None when the header did not say
+        self._partial = b''                    # trailing bytes of an incomplete frame
+        self._dtype = None
+        self._scale = 1.0
+        self._shift24 = False
+        self.sr = 0
+        self.channels = 0
+        self.k = 1
+        self._ratio: Optional[Tuple[int, int]] = None  # (up, down) correction after box decimation
+        self._window: Optional[Tuple[int, int]] = None  # (offset, count) to keep after the correction
+        self._carry = np.zeros(0, dtype=np.float32)  # samples of the current decimation block
+        self._primed = False
+        self._out: Optional[np.ndarray] = None
+        self._blocks: List[np.ndarray] = []
+        self._n_out = 0
+        self._n_in = 0
+        self._first_out = 0
+        self._dropped = 0             # header bytes already discarded from _head
+        self.data_offset: Optional[int] = None  # file offset of the first sample byte
+        self.frames: Optional[int] = None       # frames in the data chunk, when the header says
+
+    # -- header -----------------------------------------------------------
+
+    def _parse_header(self):
+        buf = self._head
+        if len(buf) < 12:
+            return
+        if buf[:4] != b'RIFF' or buf[8:12] != b'WAVE':
+            raise WavFormatError('not a RIFF/WAVE file')
+        pos = 12
+        while len(buf) >= pos + 8:
+            cid = bytes(buf[pos:pos + 4])
+            size = struct.unpack_from('<I', buf, pos + 4)[0]
+            if cid == b'data':
+                self.data_offset = self._dropped + pos + 8
+                self._start_data(size)
+                rest = bytes(buf[pos + 8:])
+                self._head = bytearray()
+                if rest:
+                    self._feed_data(rest)
+                return
+            end = pos + 8 + size + (size & 1)
+            if len(buf) < end:
+                return
+            if cid == b'fmt ':
+                self._read_fmt(bytes(buf[pos + 8:pos + 8 + size]))
+            pos = end
+        # keep only the unparsed tail so skipped chunks are not retained
+        del buf[12:pos]
+        self._dropped += pos - 12
+
+    def _read_fmt(self, body: bytes):
+        if len(body) < 16:
+            raise WavFormatError('fmt chunk too short')
+        tag, channels, sr, _, block_align, bits = struct.unpack_from('<HHIIHH', body)
+        if tag == _EXTENSIBLE and len(body) >= 26:
+            tag = struct.unpack_from('<H', body, 24)[0]
+        if channels < 1 or sr < 1 or bits < 1:
+            raise WavFormatError('invalid fmt chunk')
+        width = (bits + 7) // 8
+        if tag == _PCM:
+            if width == 1:
+                self._dtype, self._scale = np.dtype(np.uint8), 1.0 / 255.0
+            elif width == 2:
+                self._dtype, self._scale = np.dtype('<i2'), 1.0 / 32767.0
+            elif width == 3:
+                # wavfile widens 24-bit to left-justified int32
+                self._dtype, self._scale, self._shift24 = np.dtype(np.uint8), 1.0 / 2147483647.0, True
+            elif width == 4:
+                self._dtype, self._scale = np.dtype('<i4'), 1.0 / 2147483647.0
+            else:
+                raise WavFormatError(f'unsupported PCM width: {bits} bits')
+        elif tag == _FLOAT and width in (4, 8):
+            self._dtype = np.dtype('<f4' if width == 4 else '<f8')
+        else:
+            raise WavFormatError(f'unsupported wav format tag: {tag}')
+        if block_align != width * channels:
+            raise WavFormatError('unsupported block alignment')
+        self._fmt = (tag, channels, sr, block_align, width)
+        self.sr, self.channels = int(sr), int(channels)
+        self.k = decimation_factor(self.sr, self.target_sr)
+        box_sr = self._box_sr
+        if self.target_sr and self.sr > self.target_sr and box_sr != self.target_sr:
+            g = math.gcd(int(self.target_sr), box_sr)
+            self._ratio = (int(self.target_sr) // g, box_sr // g)
+
+    def _start_data(self, size: int):
+        if self._fmt is None:
+            raise WavFormatError('data chunk before fmt chunk')
+        self._in_data = True
+        if size in _UNKNOWN_SIZE:
+            return
+        self._remaining = size
+        self.frames = size // self._fmt[3]
+        self._out = np.empty(-(-self.frames // self.k), dtype=np.float32)
+
+    @property
+    def _box_sr(self) -> int:
+        return int(round(self.sr / self.k)) if self.k > 1 else self.sr
+
+    @property
+    def _box_len(self) -> Optional[int]:
+        return None if self.frames is None else -(-self.frames // self.k)
+
+    @property
+    def out_sr(self) -> int:
+        return int(self.target_sr) if self._ratio else self._box_sr
+
+    @property
+    def out_len(self) -> Optional[int]:
+        n = self._box_len
+        if n is None or not self._ratio:
+            return n
+        up, down = self._ratio
+        return -(-n * up // down)
+
+    def seek(self, index: int, count: int) -> Tuple[int, int]:
+        """Decode only output samples [index, index + count) from here on.
+
+        Call right after the header is parsed (data_offset known). Returns the
+        byte range (first, last inclusive) of the file to feed next. It covers
+        the filter warm-up on both sides (box filter, and the polyphase
+        correction if any), so the samples equal the same slice of a
+        whole-file decode.
+        """
+        if self.data_offset is None or self.frames is None:
+            raise WavFormatError('seek needs a data chunk of known size')
+        index = int(np.clip(index, 0, self.out_len))
+        count = int(np.clip(count, 0, self.out_len - index))
+        if not self._ratio:
+            return self._seek_box(index, count)
+        up, down = self._ratio
+        pad = -(-10 * max(up, down) // up) + 1  # resample_poly's default filter half-length, in input samples
+        # start on a multiple of `down` so the segment shares the whole signal's output grid
+        lo = max(0, (index * down // up - pad) // down * down)
+        hi = min(self._box_len, -(-(index + count) * down // up) + pad + 1)
+        self._window = (index - lo * up // down, count)
+        return self._seek_box(lo, hi - lo)
+
+    def _seek_box(self, index: int, count: int) -> Tuple[int, int]:
+        k, block_align = self.k, self._fmt[3]
+        first = max(0, index * k - k // 2) if k > 1 else index
+        last = min(self.frames, (index + count) * k - k // 2) if k > 1 else index + count
+        last = max(first, last)
+        self._n_in = first
+        self._first_out = index
+        self._primed = index > 0
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._partial = b''
+        self._remaining = (last - first) * block_align
+        self._out = np.empty(count, dtype=np.float32)
+        self._n_out = 0
+        self._blocks = []
+        return self.data_offset + first * block_align, self.data_offset + last * block_align - 1
+
+    @property
+    def done(self) -> bool:
+        return self._remaining == 0
+
+    # -- samples ----------------------------------------------------------
+
+    def _frames(self, raw: bytes) -> np.ndarray:
+        channels = self._fmt[1]
+        if self._shift24:
+            b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            x = ((b[:, 0] << 8) | (b[:, 1] << 16) | (b[:, 2] << 24)).astype(np.float32)
+        else:
+            x = np.frombuffer(raw, dtype=self._dtype).astype(np.float32)
+        if self._scale != 1.0:
+            x *= np.float32(self._scale)
+        if channels > 1:
+            x = x.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+        return x
+
+    def _emit(self, y: np.ndarray):
+        if y.size == 0:
+            return
+        if self._out is None:
+            self._blocks.append(y)
+        else:
+            take = min(y.size, self._out.size - self._n_out)
+            self._out[self._n_out:self._n_out + take] = y[:take]
+            y = y[:take]
+        self._n_out += y.size
+
+    def _push(self, x: np.ndarray):
+        self._n_in += x.size
+        if self.k == 1:
+            self._emit(x)
+            return
+        x = np.concatenate((self._carry, x)) if self._carry.size else x
+        if self._n_in < self.k:
+            # raw samples only: shorter than k, _decimate_to_2k shrinks the box to the signal
+            self._carry = x
+            return
+        if not self._primed:
+            # left zero padding of the centred box filter
+            x = np.concatenate((np.zeros(self.k // 2, dtype=np.float32), x))
+            self._primed = True
+        whole = (x.size // self.k) * self.k
+        if whole:
+            blocks = x[:whole].reshape(-1, self.k)
+            self._emit(blocks.mean(axis=1, dtype=np.float64).astype(np.float32))
+        self._carry = x[whole:].copy()
+
+    def _feed_data(self, chunk: bytes):
+        if self._remaining is not None:
+            chunk = chunk[:self._remaining]
+            self._remaining -= len(chunk)
+        if self._partial:
+            chunk = self._partial + chunk
+        block_align = self._fmt[3]
+        whole = (len(chunk) // block_align) * block_align
+        self._partial = chunk[whole:]
+        if whole:
+            self._push(self._frames(chunk[:whole]))
+
+    def feed(self, chunk: bytes):
+        if not chunk:
+            return
+        if self._in_data:
+            self._feed_data(chunk)
+        else:
+            self._head += chunk
+            self._parse_header()
+
+    def finish(self) -> Tuple[int, np.ndarray]:
+        if not self._in_data:
+            raise WavFormatError('no data chunk')
+        n = self._n_in
+        if n == 0:
+            raise WavFormatError('empty data chunk')
+        n_out = -(-n // self.k) - self._first_out
+        if self.k > 1:
+            if not self._primed:
+                box = np.ones(n, dtype=np.float32) / float(n)
+                self._emit(np.convolve(self._carry, box, mode='same').astype(np.float32)[::self.k])
+            elif self._carry.size and self._n_out < n_out:
+                block = np.zeros(self.k, dtype=np.float32)
+                block[:self._carry.size] = self._carry
+                self._emit(block.mean(dtype=np.float64).astype(np.float32).reshape(1))
+            self._carry = np.zeros(0, dtype=np.float32)
+        if self._out is None:
+            y = np.concatenate(self._blocks) if len(self._blocks) > 1 else self._blocks[0]
+            self._blocks = []
+        else:
+            y = self._out
+        # the padded tail can add one block too many; a truncated upload fills less than the header promised
+        y = y[:min(n_out, self._n_out)]
+        if self._ratio:
+            y = resample_poly(y, *self._ratio).astype(np.float32)
+            if self._window:
+                offset, count = self._window
+                y = y[offset:offset + count]
+        return self.out_sr, y